@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from notation import read_board
+from batch import analyze_position, read_time_ms, read_search_depth, MAX_SEARCH_DEPTH
+
+# Input positions, one JSON value per line: a notation string, a board grid
+# as in ui/src/assets/boards, or an object {"id", "board", "color", "depth",
+# "time_ms"} where everything but board is optional. A directory is read as
+# one board grid per .txt file. Every result line carries the id (the file
+# name, or the input line number when none is given) and the position index.
+
+def read_positions(inputs):
+    # (id, JSON text) for every position, in input order
+    for source in inputs:
+        if source != "-" and os.path.isdir(source):
+            for file_name in sorted(os.listdir(source)):
+                if not file_name.endswith(".txt"):
+                    continue
+                with open(os.path.join(source, file_name)) as board_file:
+                    yield file_name, board_file.read()
+            continue
+
+        input_file = sys.stdin if source == "-" else open(source)
+        try:
+            for line_number, line in enumerate(input_file, 1):
+                if not line.strip():
+                    continue
+                yield f"{source}:{line_number}", line
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+
+def _init_worker():
+    # Results go to stdout, anything the search prints goes to stderr
+    sys.stdout = sys.stderr
+
+def analyze_record(task):
+    position_id, text, search_depth, time_ms = task
+    try:
+        record = json.loads(text)
+        if isinstance(record, dict):
+            position_id = record.get("id", position_id)
+            board, color = read_board(record["board"])
+            color = record.get("color", color)
+            # A time budget of the position's own deepens as far as the server would
+            record_time_ms = read_time_ms(record)
+            if record_time_ms is not None:
+                time_ms = record_time_ms
+                search_depth = MAX_SEARCH_DEPTH
+            search_depth = read_search_depth(record, search_depth)
+        else:
+            board, color = read_board(record)
+    except Exception as e:
+        return {"id": position_id, "error": f"Invalid position: {e}"}
+    result = analyze_position(board, color or "Silver", search_depth, time_ms)
+    return {"id": position_id, **result}
+
+def analyze_stream(inputs, output_file, workers, search_depth, time_ms, window):
+    # At most window positions are in flight, results are written in input
+    # order as soon as every earlier one is done
+    positions = 0
+    errors = 0
+    start = time.perf_counter()
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        def write_next():
+            nonlocal errors
+            index, future = pending.popleft()
+            result = {"index": index, **future.result()}
+            if "error" in result:
+                errors += 1
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+
+        for index, (position_id, text) in enumerate(read_positions(inputs)):
+            pending.append((index, executor.submit(analyze_record, (position_id, text, search_depth, time_ms))))
+            positions += 1
+            if len(pending) >= window:
+                write_next()
+        while pending:
+            write_next()
+
+    elapsed = time.perf_counter() - start
+    print(f"Analyzed {positions} positions ({errors} errors) in {elapsed:.1f}s, {positions / elapsed if elapsed > 0 else 0:.1f} per second", file=sys.stderr)
+    return positions, errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze positions from JSONL files or board directories and write JSONL results")
+    parser.add_argument("inputs", nargs="+", help="JSONL files, directories of board files, or - for stdin")
+    parser.add_argument("--output", default="-", help="results file, stdout by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--depth", type=int, default=4, help="search depth unless a position sets its own")
+    parser.add_argument("--time-ms", type=int, help="time per position instead of a fixed depth")
+    parser.add_argument("--window", type=int, help="positions in flight, default four per worker")
+    args = parser.parse_args()
+
+    search_depth = args.depth if args.time_ms is None else MAX_SEARCH_DEPTH
+    window = args.window or args.workers * 4
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        _, errors = analyze_stream(args.inputs, output_file, args.workers, search_depth, args.time_ms, window)
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    sys.exit(1 if errors else 0)
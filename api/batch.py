@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from board import format_move
+from notation import parse_fen
+from solver import Solver
+
+MAX_SEARCH_DEPTH = 20 # upper bound for iterative deepening when a time budget is given
+
+def read_time_ms(data):
+    time_ms = data.get('time_ms')
+    if time_ms is None:
+        return None
+    if not isinstance(time_ms, int) or isinstance(time_ms, bool):
+        raise ValueError("time_ms is not a whole number")
+    if time_ms <= 0:
+        raise ValueError("time_ms is not positive")
+    return time_ms
+
+def read_search_depth(data, default):
+    search_depth = data.get('depth', default)
+    if not isinstance(search_depth, int) or isinstance(search_depth, bool) or not 1 <= search_depth <= MAX_SEARCH_DEPTH:
+        raise ValueError(f"depth is not a whole number from 1 to {MAX_SEARCH_DEPTH}")
+    return search_depth
+
+def analyze_position(board, color="Silver", search_depth=4, time_ms=None):
+    # Best line for color to move, with the value from color's side
+    solver = Solver(board, color, search_depth=search_depth, time_ms=time_ms)
+    start = time.perf_counter()
+    try:
+        line = solver.solve_multi_agent(solver.root)
+    except Exception as e:
+        return {"error": str(e) or e.__class__.__name__}
+    return {
+        "move": format_move(line[0]) if line else None,
+        "value": solver.root.value,
+        "line": [format_move(move) for move in line],
+        "depth": solver.search_stats.depth,
+        "nodes": solver.nodes_searched,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+def analyze_fen(task):
+    # Process pool entry point, positions travel as FEN strings
+    fen, color, search_depth, time_ms = task
+    board, _ = parse_fen(fen)
+    return analyze_position(board, color, search_depth, time_ms)
+
+def analyze_batch(tasks, workers=1, on_result=None, stop_event=None):
+    # Results for (fen, color, search depth, time_ms) tasks, in task order.
+    # on_result(results so far) is called after each one, once stop_event is
+    # set the remaining tasks are skipped and the results so far returned.
+    results = []
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            if stop_event is not None and stop_event.is_set():
+                break
+            results.append(analyze_fen(task))
+            if on_result is not None:
+                on_result(results)
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        futures = [executor.submit(analyze_fen, task) for task in tasks]
+        for future in futures:
+            if stop_event is not None and stop_event.is_set():
+                executor.shutdown(cancel_futures=True)
+                break
+            results.append(future.result())
+            if on_result is not None:
+                on_result(results)
+    return results
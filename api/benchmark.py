@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from piece import Pharaoh
+from board import parse_board_data
+from compact_board import CompactBoard
+from movegen import PASS_MOVE, decode_move
+from solver import Solver
+from book import BOARDS_DIR
+
+BENCHMARK_VERSION = 1
+SECTIONS = ["perft", "laser", "make_move", "search"]
+MIDGAME_PLIES = [6, 12] # random plies played from each bundled board
+MIDGAME_SEED = 2024
+
+# Counts have to match the baseline exactly, rates may drop by the tolerance
+COUNT_FIELDS = {"perft": ["nodes"], "search": ["nodes", "value", "move"]}
+RATE_FIELDS = {"perft": "nodes_per_second", "laser": "traces_per_second", "make_move": "moves_per_second", "search": "nodes_per_second"}
+MIN_TIMED_SECONDS = 0.01 # rates of shorter measurements are too noisy to compare
+
+def other_color(color):
+    return "Red" if color == "Silver" else "Silver"
+
+def bundled_boards():
+    names = sorted(file_name[:-4] for file_name in os.listdir(BOARDS_DIR) if file_name.endswith(".txt"))
+    boards = []
+    for name in names:
+        with open(os.path.join(BOARDS_DIR, name + ".txt")) as board_file:
+            boards.append((name, parse_board_data(json.load(board_file))))
+    return boards
+
+def midgame_positions(boards, plies_list=MIDGAME_PLIES, seed=MIDGAME_SEED):
+    # Random but reproducible games, no PASS and no move that hits a Pharaoh.
+    # Plies are even so Silver is to move like in the bundled boards.
+    positions = []
+    for name, start_board in boards:
+        rng = random.Random(f"{seed}:{name}")
+        for plies in plies_list:
+            board = start_board.deepcopy()
+            color = "Silver"
+            for _ in range(plies):
+                moves = [move for move in board.generate_moves(color) if move != PASS_MOVE]
+                rng.shuffle(moves)
+                for move in moves:
+                    undo = board.apply_move(decode_move(board, move), color)
+                    if not isinstance(undo.piece_destroyed, Pharaoh):
+                        break
+                    board.undo_move(undo)
+                else:
+                    break
+                color = other_color(color)
+            else:
+                positions.append((f"{name}@{plies}", board))
+    return positions
+
+def corpus(names=None):
+    boards = bundled_boards()
+    positions = boards + midgame_positions(boards)
+    if names:
+        positions = [(name, board) for name, board in positions if name in names or name.split("@")[0] in names]
+    return positions
+
+def perft(board, color, depth):
+    # Leaf count of the move tree, a Pharaoh hit ends the line
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in board.generate_moves(color):
+        undo = board.apply_move(decode_move(board, move), color)
+        if isinstance(undo.piece_destroyed, Pharaoh):
+            nodes += 1
+        else:
+            nodes += perft(board, other_color(color), depth - 1)
+        board.undo_move(undo)
+    return nodes
+
+def best_of(repeat, run):
+    # Shortest of repeat runs, with the result of the last one
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, result
+
+def bench_perft(board, depth, repeat):
+    working_board = board.deepcopy()
+    seconds, nodes = best_of(repeat, lambda: perft(working_board, "Silver", depth))
+    return {"depth": depth, "nodes": nodes, "seconds": seconds, "nodes_per_second": nodes / seconds}
+
+def bench_laser(board, traces, repeat):
+    # Full traces for both colors with the path cache emptied every time
+    working_board = board.deepcopy()
+    def run():
+        for _ in range(traces):
+            for color in ("Silver", "Red"):
+                working_board.laser_cache.clear()
+                working_board.trace_laser(color)
+    seconds, _ = best_of(repeat, run)
+    return {"traces": traces * 2, "seconds": seconds, "traces_per_second": traces * 2 / seconds}
+
+def bench_make_move(board, rounds, repeat):
+    # Every legal move applied and undone, rounds times over. make_move
+    # copies the board for each move, so it gets a single round.
+    working_board = board.deepcopy()
+    moves = [decode_move(working_board, move) for move in working_board.generate_moves("Silver")]
+    def apply_and_undo():
+        for _ in range(rounds):
+            for move in moves:
+                working_board.undo_move(working_board.apply_move(move, "Silver"))
+    seconds, _ = best_of(repeat, apply_and_undo)
+    copy_seconds, _ = best_of(repeat, lambda: [board.make_move(move, check_allowed=False) for move in moves])
+    return {
+        "moves": len(moves) * rounds,
+        "seconds": seconds,
+        "moves_per_second": len(moves) * rounds / seconds,
+        "copying_moves_per_second": len(moves) / copy_seconds,
+    }
+
+def bench_search(board, depth, repeat):
+    # A new solver for every run so the transposition table starts empty
+    def run():
+        solver = Solver(board, "Silver", search_depth=depth)
+        solver.search(solver.root, True)
+        return solver
+    seconds, solver = best_of(repeat, run)
+    best_child = solver.root.best_child
+    move = None
+    if best_child is not None and best_child.move[0] is not None:
+        piece, move_action = best_child.move
+        move = f"{piece.position[0]},{piece.position[1]},{move_action}"
+    return {
+        "depth": depth,
+        "nodes": solver.nodes_searched,
+        "seconds": seconds,
+        "nodes_per_second": solver.nodes_searched / seconds,
+        "value": solver.root.value,
+        "move": move,
+    }
+
+def run_benchmarks(positions, sections=SECTIONS, perft_depth=2, search_depth=3, repeat=3, traces=2000, rounds=20, compact=False):
+    results = {section: {} for section in sections}
+    for name, board in positions:
+        if compact:
+            board = CompactBoard.from_board(board)
+        if "perft" in sections:
+            results["perft"][name] = bench_perft(board, perft_depth, repeat)
+        if "laser" in sections:
+            results["laser"][name] = bench_laser(board, traces, repeat)
+        if "make_move" in sections:
+            results["make_move"][name] = bench_make_move(board, rounds, repeat)
+        if "search" in sections:
+            results["search"][name] = bench_search(board, search_depth, repeat)
+        print(f"{name}: done", file=sys.stderr)
+    return results
+
+def compare(results, baseline_results, tolerance):
+    # Lines describing every count that changed and every rate that fell
+    # more than tolerance below the baseline
+    problems = []
+    for section, positions in results.items():
+        baseline_positions = baseline_results.get(section, {})
+        for name, result in positions.items():
+            baseline = baseline_positions.get(name)
+            if baseline is None:
+                continue
+            for field in COUNT_FIELDS.get(section, []):
+                if result.get(field) != baseline.get(field):
+                    problems.append(f"{section} {name}: {field} {baseline.get(field)} -> {result.get(field)}")
+            rate_field = RATE_FIELDS[section]
+            if baseline["seconds"] < MIN_TIMED_SECONDS:
+                continue
+            if result[rate_field] < baseline[rate_field] * (1 - tolerance):
+                change = result[rate_field] / baseline[rate_field] - 1
+                problems.append(f"{section} {name}: {rate_field} {baseline[rate_field]:.0f} -> {result[rate_field]:.0f} ({change:+.0%})")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark move generation, lasers, moves and search over the bundled boards and generated midgames")
+    parser.add_argument("boards", nargs="*", help="positions to run, by name or bundled board, default all")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed drop in a rate before it counts as a regression")
+    parser.add_argument("--sections", default=",".join(SECTIONS))
+    parser.add_argument("--perft-depth", type=int, default=2)
+    parser.add_argument("--search-depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement, the fastest is kept")
+    parser.add_argument("--compact", action="store_true", help="run perft, laser and make_move on CompactBoard")
+    args = parser.parse_args()
+
+    sections = [section for section in args.sections.split(",") if section]
+    positions = corpus(args.boards)
+    config = {
+        "sections": sections,
+        "positions": [name for name, _ in positions],
+        "perft_depth": args.perft_depth,
+        "search_depth": args.search_depth,
+        "repeat": args.repeat,
+        "compact": args.compact,
+        "midgame_seed": MIDGAME_SEED,
+    }
+    results = run_benchmarks(positions, sections, args.perft_depth, args.search_depth, args.repeat, compact=args.compact)
+    report = {
+        "version": BENCHMARK_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        for key in ("perft_depth", "search_depth", "compact"):
+            if baseline["config"].get(key) != config[key]:
+                print(f"Baseline was run with {key} {baseline['config'].get(key)}, this run with {config[key]}")
+        problems = compare(results, baseline["results"], args.tolerance)
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} regressions against {args.baseline}")
+        sys.exit(1 if problems else 0)
@@ -1,6 +1,7 @@
 from piece import Pharaoh, Anubis, Pyramid, Scarab, Sphynx, action, surface, parse_piece_str, create_piece_from_str
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from zobrist import COLOR_INDEX, piece_key
+from laser import LASER_OUTCOMES, get_ray_table, trace
+from movegen import get_move_tables, generate_moves, decode_move
 
 def parse_board_data(board_data):
     n = len(board_data)
@@ -41,6 +42,14 @@ def parse_move_data(move_data, board):
     move = (piece, action_enum)
 
     return move
+
+def format_move(move):
+    # Inverse of parse_move_data
+    piece, action = move
+    if piece is None:
+        return "PASS"
+    r, c = piece.position
+    return f"{r},{c},{action}"
     
 
 def print_moves(moves):
@@ -54,10 +63,29 @@ def print_move(move):
     else:
         print(f"PASS")
 
+class MoveUndo:
+    def __init__(self, piece, action, old_position, old_orientation, swapped_piece, piece_destroyed, destroyed_position):
+        self.piece = piece
+        self.action = action
+        self.old_position = old_position
+        self.old_orientation = old_orientation
+        self.swapped_piece = swapped_piece
+        self.piece_destroyed = piece_destroyed
+        self.destroyed_position = destroyed_position
+
 class Board:
     def __init__(self, m=10, n=8, list_of_pieces=None):
         self.m = m
         self.n = n
+        self.zobrist_hash = 0
+        self.occupancy = 0 # bit y * m + x is set when that square holds a piece
+        self.color_occupancy = [0, 0] # the same per color, indexed by COLOR_INDEX
+        self.ray_table = get_ray_table(m, n)
+        self.move_tables = get_move_tables(m, n)
+        # color -> position, kept by set_grid_position so lookups skip the grid scan
+        self.sphynx_positions = {}
+        self.pharaoh_positions = {}
+        self.laser_cache = {} # color -> LaserPath of the last trace
         self.grid = self.initialize_board(list_of_pieces)
     
     def initialize_board(self, list_of_pieces):
@@ -67,6 +95,10 @@ class Board:
             for current_piece in list_of_pieces:
                 x, y = current_piece.position
                 grid[y][x] = current_piece
+                self.zobrist_hash ^= piece_key(current_piece, current_piece.position)
+                self.occupancy |= 1 << (y * self.m + x)
+                self.color_occupancy[COLOR_INDEX[current_piece.color]] |= 1 << (y * self.m + x)
+                self.track_piece(current_piece, current_piece.position)
 
         return grid
     
@@ -80,14 +112,15 @@ class Board:
         return True
     
     def __hash__(self):
-        piece_hashes = tuple((piece.color, piece.__class__.__name__, piece.position, piece.orientation) for piece in self.get_list_of_pieces())
-        return hash((self.m, self.n, piece_hashes))
+        # Maintained incrementally by set_grid_position and rotate_piece
+        return self.zobrist_hash
 
     def deepcopy(self):
         new_list_of_pieces = []
         for piece in self.get_list_of_pieces():
             new_list_of_pieces.append(piece.deepcopy())
         new_board = Board(m=self.m, n=self.n, list_of_pieces=new_list_of_pieces)
+        new_board.laser_cache = dict(self.laser_cache)
 
         return new_board
     
@@ -96,87 +129,68 @@ class Board:
             print(" ".join([str(piece) if piece else '.' for piece in row]))
     
     def is_pharoh_destroyed(self, color):
-        for row in self.grid:
-            for piece in row:
-                if isinstance(piece, Pharaoh) and piece.color == color:
-                    return False
-        return True
+        return color not in self.pharaoh_positions
     
+    def trace_laser(self, color, record_path=False):
+        laser_path = self.laser_cache.get(color)
+        if laser_path is None or (record_path and laser_path.path is None):
+            Sphynx = self.get_sphynx(color)
+            if Sphynx is None:
+                return None, None
+
+            x, y = Sphynx.get_position()
+            laser_path = trace(self.ray_table, self.occupancy, self.laser_outcome, y * self.m + x, Sphynx.orientation, record_path)
+            self.laser_cache[color] = laser_path
+        return laser_path.path, laser_path.hit_square
+
+    def invalidate_laser_paths(self, square):
+        # Only a change on a square the beam depends on can change its path
+        if self.laser_cache:
+            bit = 1 << square
+            for color in [color for color, laser_path in self.laser_cache.items() if laser_path.mask & bit]:
+                del self.laser_cache[color]
+
+    def laser_outcome(self, square, direction):
+        piece = self.grid[square // self.m][square % self.m]
+        return LASER_OUTCOMES[piece.type_index][piece.orientation][direction]
+
     def fire_laser(self, color):
-        Sphynx = self.get_sphynx(color)
-        if Sphynx is None:
+        _, hit_square = self.trace_laser(color)
+        if hit_square is None:
             return None
-        
-        x, y = Sphynx.get_position()
-        laser_direction = Sphynx.get_laser_direction()
-        #print(f"Firing laser from Sphinx at ({x}, {y}) in direction {laser_direction}")
-
-        laser_traveling = True
-
-        while laser_traveling:
-            x += laser_direction.value[0]
-            y += laser_direction.value[1]
-
-            # Check if the laser has left the board
-            if not (0 <= x < self.m and 0 <= y < self.n):
-                return None #TODO placeholder
-            #print(f"Evaluating ({x}, {y})")
-            piece = self.get_grid_position((x, y))
-            if piece is not None:
-                surface_hit = piece.get_surface_hit(laser_direction)
-                #print(f"Surface hit: {surface_hit} on {piece} at ({x}, {y})")
-                if surface_hit == surface.BLOCKER or surface_hit == surface.EMIT_LASER:
-                    return None #TODO placeholder
-                elif surface_hit == surface.REFLECT_CW or surface_hit == surface.REFLECT_CCW:
-                    laser_direction = piece.reflect_laser(laser_direction)
-                    #print(f"Reflecting to {laser_direction}")
-                else: # surface_hit should be vunerable
-                    laser_traveling = False
-        
-        hit_piece = self.get_grid_position((x, y))
-        self.set_grid_position(None, (x, y))
+
+        position = self.ray_table.positions[hit_square]
+        hit_piece = self.get_grid_position(position)
+        self.set_grid_position(None, position)
         return hit_piece
     
     def get_actionable_spaces(self, color):
-        Sphynx = self.get_sphynx(color)
-        if Sphynx is None:
+        actionable_spaces, _ = self.trace_laser(color, record_path=True)
+        if actionable_spaces is None:
             return None
-        
-        x, y = Sphynx.get_position()
-        laser_direction = Sphynx.get_laser_direction()
-
-        laser_traveling = True
-        actionable_spaces = []
-
-        while laser_traveling:
-            x += laser_direction.value[0]
-            y += laser_direction.value[1]
-            actionable_spaces.append((x, y))
-
-            # Check if the laser has left the board
-            if not (0 <= x < self.m and 0 <= y < self.n):
-                break
-            #print(f"Evaluating ({x}, {y})")
-            piece = self.get_grid_position((x, y))
-            if piece is not None:
-                surface_hit = piece.get_surface_hit(laser_direction)
-                #print(f"Surface hit: {surface_hit} on {piece} at ({x}, {y})")
-                if surface_hit == surface.BLOCKER or surface_hit == surface.EMIT_LASER:
-                    break
-                elif surface_hit == surface.REFLECT_CW or surface_hit == surface.REFLECT_CCW:
-                    laser_direction = piece.reflect_laser(laser_direction)
-                    #print(f"Reflecting to {laser_direction}")
-                else: # surface_hit should be vunerable
-                    laser_traveling = False
-        
-        return actionable_spaces
+        return list(actionable_spaces)
+
+    def get_pharaoh_position(self, color):
+        return self.pharaoh_positions.get(color)
 
     def get_sphynx(self, color):
-        for row in self.grid:
-            for piece in row:
-                if isinstance(piece, Sphynx) and piece.color == color:
-                    return piece
-        return None
+        position = self.sphynx_positions.get(color)
+        if position is None:
+            return None
+        return self.get_grid_position(position)
+
+    def track_piece(self, piece, position):
+        if isinstance(piece, Sphynx):
+            self.sphynx_positions[piece.color] = position
+        elif isinstance(piece, Pharaoh):
+            self.pharaoh_positions[piece.color] = position
+
+    def untrack_piece(self, piece, position):
+        # A piece that has already been placed elsewhere keeps its entry
+        if isinstance(piece, Sphynx) and self.sphynx_positions.get(piece.color) == position:
+            del self.sphynx_positions[piece.color]
+        elif isinstance(piece, Pharaoh) and self.pharaoh_positions.get(piece.color) == position:
+            del self.pharaoh_positions[piece.color]
     
     def get_list_of_pieces(self):
         list_of_pieces = []
@@ -187,39 +201,54 @@ class Board:
         return list_of_pieces
 
     def display_board(self):
-        fig, ax = plt.subplots()
-        ax.set_xlim(0, self.m)
-        ax.set_ylim(0, self.n)
-        ax.set_aspect('equal')
-
-        cell_width = 1
-        cell_height = 1
-
-        for i, row in enumerate(self.grid):
-            for j, piece in enumerate(row):
-                rect = patches.Rectangle((j * cell_width, (7 - i) * cell_height), cell_width, cell_height, linewidth=1, edgecolor='black', facecolor='none')
-                ax.add_patch(rect)
-                if piece:
-                    ax.text(j * cell_width + cell_width / 2, (7 - i) * cell_height + cell_height / 2, str(piece), ha='center', va='center', fontsize=12, color=piece.color)
-
-        # Set the ticks to have chesslike rank and file annotations
-        ax.set_xticks([i + 0.5 for i in range(self.m)])
-        ax.set_yticks([i + 0.5 for i in range(self.n)])
-        ax.set_xticklabels([str(i) for i in range(self.m)])
-        ax.set_yticklabels([str(self.n - i - 1) for i in range(self.n)])
-
-        plt.gca().invert_yaxis()
-        plt.show()
+        from visualization import display_board
+        display_board(self)
 
     def get_grid_position(self, position):
         x, y = position
         return self.grid[y][x]
+
+    def piece_at(self, square):
+        piece = self.grid[square // self.m][square % self.m]
+        return piece.type_index, piece.orientation
     
     def set_grid_position(self, piece, position):
         x, y = position
+        self.invalidate_laser_paths(y * self.m + x)
+        bit = 1 << (y * self.m + x)
+        occupant = self.grid[y][x]
+        if occupant is not None:
+            self.zobrist_hash ^= piece_key(occupant, position)
+            self.color_occupancy[COLOR_INDEX[occupant.color]] &= ~bit
+            self.untrack_piece(occupant, position)
         self.grid[y][x] = piece
         if piece is not None:
             piece.set_position(position)
+            self.zobrist_hash ^= piece_key(piece, position)
+            self.occupancy |= bit
+            self.color_occupancy[COLOR_INDEX[piece.color]] |= bit
+            self.track_piece(piece, position)
+        else:
+            self.occupancy &= ~bit
+
+    def rotate_piece(self, position, dtheta):
+        x, y = position
+        self.invalidate_laser_paths(y * self.m + x)
+        piece = self.get_grid_position(position)
+        self.zobrist_hash ^= piece_key(piece, position)
+        if dtheta == 1:
+            piece.rotate_cw()
+        else:
+            piece.rotate_ccw()
+        self.zobrist_hash ^= piece_key(piece, position)
+
+    def orient_piece(self, position, orientation):
+        x, y = position
+        self.invalidate_laser_paths(y * self.m + x)
+        piece = self.get_grid_position(position)
+        self.zobrist_hash ^= piece_key(piece, position)
+        piece.set_orientation(orientation)
+        self.zobrist_hash ^= piece_key(piece, position)
 
     def check_move_position(self, position, action):
         piece = self.get_grid_position(position)
@@ -260,15 +289,9 @@ class Board:
         # Check if the new position is within the board boundaries
         if not (0 <= new_position[0] < (self.m) and 0 <= new_position[1] < (self.n)):
             return False
-        #add in forbidden space check
-
-        if piece.color == "Silver" and new_position[0] == 0:
-            return False
-        elif piece.color == "Red" and new_position[0] == self.m - 1:
-            return False
-        elif piece.color == "Silver" and (new_position == (self.m - 2, self.n - 1) or new_position == (self.m - 2, 0)):
-            return False
-        elif piece.color == "Red" and (new_position == (1, self.n - 1) or new_position == (1, 0)):
+        # Same forbidden squares as the move generator
+        target = new_position[1] * self.m + new_position[0]
+        if (self.move_tables.forbidden[COLOR_INDEX[piece.color]] >> target) & 1:
             return False
 
         # Check if the new position is occupied by another piece of the same color
@@ -293,37 +316,72 @@ class Board:
             print_move(move)
             self.display_board()
             raise Exception("Invalid move")
-        piece_old, action = move
         new_board = self.deepcopy()
+        new_board.move_piece(move)
+        return new_board
+
+    def move_piece(self, move):
+        # Moves or rotates the piece in place, returns the piece it swapped places with
+        piece_old, action = move
 
         if action == action.PASS and piece_old == None:
-            return new_board
+            return None
 
-        piece = new_board.get_grid_position(piece_old.position)
+        piece = self.get_grid_position(piece_old.position)
         dx, dy, dtheta = action.value
         x, y = piece.position
         old_position = piece.position
         new_position = (x + dx, y + dy)
 
+        if dtheta != 0:
+            self.rotate_piece(new_position, dtheta)
+            return None
 
+        #swap pieces in the positions. If the next space is none then the old space will be none
+        piece_in_next_space = self.get_grid_position(new_position)
+        self.set_grid_position(piece, new_position)
+        self.set_grid_position(piece_in_next_space, old_position)
+        return piece_in_next_space
 
-        if dtheta == 1:
-            new_board.get_grid_position(new_position).rotate_cw()
-        elif dtheta == -1:
-            new_board.get_grid_position(new_position).rotate_ccw()
-        else:
-            #swap pieces in the positions. If the next space is none then the old space will be none
-            piece_in_next_space = new_board.get_grid_position(new_position)
-            new_board.set_grid_position(piece, new_position)
-            new_board.set_grid_position(piece_in_next_space, old_position)
-            
-        return new_board
+    def apply_move(self, move, color, check_allowed=False):
+        # In place alternative to make_move followed by fire_laser, reverse with undo_move
+        if check_allowed == True and self.check_move(move) == False:
+            print_move(move)
+            raise Exception("Invalid move")
+        piece_old, move_action = move
+        piece = None
+        old_position = None
+        old_orientation = None
+        if piece_old is not None:
+            old_position = piece_old.position
+            piece = self.get_grid_position(old_position)
+            old_orientation = piece.orientation
+
+        swapped_piece = self.move_piece(move)
+        piece_destroyed = self.fire_laser(color)
+        destroyed_position = piece_destroyed.position if piece_destroyed is not None else None
+        return MoveUndo(piece, move_action, old_position, old_orientation, swapped_piece, piece_destroyed, destroyed_position)
+
+    def undo_move(self, undo):
+        if undo.piece_destroyed is not None:
+            self.set_grid_position(undo.piece_destroyed, undo.destroyed_position)
+
+        if undo.piece is None or undo.action == action.PASS:
+            return
+
+        dx, dy, dtheta = undo.action.value
+        if dtheta != 0:
+            self.orient_piece(undo.old_position, undo.old_orientation)
+            return
+
+        x, y = undo.old_position
+        new_position = (x + dx, y + dy)
+        self.set_grid_position(undo.piece, undo.old_position)
+        self.set_grid_position(undo.swapped_piece, new_position)
     
     def get_all_possible_moves(self, color):
-        possible_moves = []
-        for piece in self.get_list_of_pieces():
-            if piece.color == color:
-                for move in self.list_possible_moves(piece):
-                    possible_moves.append((piece, move))
-        possible_moves.append((None, action.PASS))
-        return possible_moves
\ No newline at end of file
+        return [decode_move(self, move) for move in generate_moves(self, color)]
+
+    def generate_moves(self, color):
+        # Move codes, see movegen.py
+        return generate_moves(self, color)
\ No newline at end of file
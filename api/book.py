@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+from piece import Pharaoh
+from board import parse_board_data
+from movegen import decode_move
+from move_ordering import move_key
+from solver import Solver
+from zobrist import side_key
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BOOK_FILE = os.path.join(API_DIR, "opening_book.bin")
+BOARDS_DIR = os.path.join(API_DIR, "..", "ui", "src", "assets", "boards")
+BUNDLED_BOARDS = ["classic", "sneaky_sphinx", "hand_of_anubis", "the_pharaohs_tomb", "mate_1", "mate_2", "mate_3"]
+
+BOOK_MAGIC = b"KHETBOOK"
+BOOK_VERSION = 2
+HEADER = struct.Struct("<8sII")  # magic, version, number of records
+# Position key, move code, depth searched, value for the side to move (mate
+# scores as win_reward / plies from the position itself).
+# Records are sorted by key so a lookup is a binary search over the mapped file.
+RECORD = struct.Struct("<QHBxd")
+
+class BookEntry:
+    def __init__(self, key, move, depth, value):
+        self.key = key
+        self.move = move
+        self.depth = depth
+        self.value = value
+
+def position_key(board, color):
+    return board.zobrist_hash ^ side_key(color)
+
+def write_records(path, entries, header=None):
+    # entries: key -> BookEntry, header is the packed file header, the book's by default
+    if header is None:
+        header = HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(entries))
+    with open(path, "wb") as book_file:
+        book_file.write(header)
+        for key in sorted(entries):
+            entry = entries[key]
+            book_file.write(RECORD.pack(key, entry.move, entry.depth, entry.value))
+
+class Book:
+    # Subclasses with their own file header set these, the fields after the
+    # number of records end up in header_fields
+    file_kind = "book"
+    file_magic = BOOK_MAGIC
+    file_version = BOOK_VERSION
+    header = HEADER
+
+    def __init__(self, path=DEFAULT_BOOK_FILE):
+        self.path = path
+        self.book_file = open(path, "rb")
+        self.data = mmap.mmap(self.book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_records, *self.header_fields = self.header.unpack_from(self.data, 0)
+        if magic != self.file_magic or version != self.file_version:
+            self.close()
+            raise ValueError(f"{path} is not a version {self.file_version} {self.file_kind}")
+
+    @classmethod
+    def load_default(cls):
+        if os.path.exists(DEFAULT_BOOK_FILE):
+            return cls(DEFAULT_BOOK_FILE)
+        return None
+
+    def close(self):
+        self.data.close()
+        self.book_file.close()
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, self.header.size + index * RECORD.size)
+
+    def lookup_key(self, key):
+        low, high = 0, self.num_records
+        while low < high:
+            middle = (low + high) // 2
+            record_key = self.record(middle)[0]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return BookEntry(*self.record(middle))
+        return None
+
+    def lookup(self, board, color):
+        entry = self.lookup_key(position_key(board, color))
+        if entry is None:
+            return None
+        # A different position with the same key would not have this move
+        if not board.check_move(decode_move(board, entry.move)):
+            return None
+        return entry
+
+    def __len__(self):
+        return self.num_records
+
+def add_line(entries, solver, node, color, search_depth):
+    # Stores every position on the principal variation below node, keeping
+    # the deepest search of each
+    while node.best_child is not None:
+        key = position_key(node.board, color)
+        depth = search_depth - node.depth
+        value = node.value if color == solver.player_color else -node.value
+        if abs(value) > solver.evaluator.max_value:
+            # Mate scores are win_reward / plies from the search root, store
+            # them as seen from this position
+            plies = round(solver.win_reward / abs(value)) - node.depth
+            value = math.copysign(solver.win_reward / plies, value)
+        existing = entries.get(key)
+        if existing is None or existing.depth < depth:
+            entries[key] = BookEntry(key, move_key(node.best_child.move), depth, value)
+        node = node.best_child
+        color = "Red" if color == "Silver" else "Silver"
+
+def build_book(board_names=BUNDLED_BOARDS, path=DEFAULT_BOOK_FILE, search_depth=6, plies=2, replies=3, player_color="Silver"):
+    # Searches each starting position, then the positions after our best move
+    # and each of the opponent's most likely replies, plies times over
+    entries = {}
+    opponent_color = "Red" if player_color == "Silver" else "Silver"
+    for board_name in board_names:
+        with open(os.path.join(BOARDS_DIR, board_name + ".txt")) as board_file:
+            frontier = [parse_board_data(json.load(board_file))]
+
+        for ply in range(plies + 1):
+            next_frontier = []
+            for board in frontier:
+                solver = Solver(board, player_color, search_depth=search_depth, retain_ply=2)
+                solver.search(solver.root, True)
+                add_line(entries, solver, solver.root, player_color, search_depth)
+                print(f"{board_name} ply {ply * 2}: {len(entries)} positions")
+
+                best_child = solver.root.best_child
+                if best_child is None or isinstance(best_child.piece_destroyed, Pharaoh) or ply == plies:
+                    continue
+                position = best_child.board
+                moves = solver.move_orderer.order(position, position.generate_moves(opponent_color), opponent_color, best_child.depth)
+                for move in moves[:replies]:
+                    next_board = position.deepcopy()
+                    undo = next_board.apply_move(decode_move(next_board, move), opponent_color)
+                    if not isinstance(undo.piece_destroyed, Pharaoh):
+                        next_frontier.append(next_board)
+            frontier = next_frontier
+
+    write_records(path, entries)
+    return len(entries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book for the bundled boards")
+    parser.add_argument("boards", nargs="*", default=BUNDLED_BOARDS)
+    parser.add_argument("--output", default=DEFAULT_BOOK_FILE)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--plies", type=int, default=2, help="opponent replies to follow from each start")
+    parser.add_argument("--replies", type=int, default=3, help="opponent moves followed at each ply")
+    args = parser.parse_args()
+    num_positions = build_book(args.boards, args.output, args.depth, args.plies, args.replies)
+    print(f"Wrote {num_positions} positions to {args.output}")
@@ -0,0 +1,63 @@
+import argparse
+import os
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules every server worker and search process imports
+DEFAULT_MODULES = ["server", "solver", "parallel"]
+# Only the debug plots in visualization.py may load these
+FORBIDDEN_MODULES = ["matplotlib", "networkx", "numpy"]
+DEFAULT_BUDGET_MS = 500
+
+def import_times(module):
+    # (package, cumulative microseconds) for every import module triggers,
+    # measured in a fresh interpreter with -X importtime
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=API_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue # the header line
+        times.append((package.rstrip(), int(cumulative)))
+    return times
+
+def check_module(module, budget_ms, top):
+    # Prints the report for module and returns the problems found
+    times = import_times(module)
+    # Top level imports are the ones without indentation
+    total_ms = sum(cumulative for package, cumulative in times if not package.startswith("  ")) / 1000
+    loaded = {package.strip().split(".")[0] for package, _ in times}
+
+    print(f"{module}: {total_ms:.0f} ms (budget {budget_ms} ms)")
+    slowest = sorted(times, key=lambda entry: entry[1], reverse=True)
+    for package, cumulative in slowest[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {package.strip()}")
+
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(f"{module} takes {total_ms:.0f} ms to import, over the {budget_ms} ms budget")
+    for forbidden in FORBIDDEN_MODULES:
+        if forbidden in loaded:
+            problems.append(f"{module} imports {forbidden}")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of the server and search modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    args = parser.parse_args()
+
+    problems = []
+    for module in args.modules:
+        problems += check_module(module, args.budget_ms, args.top)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,355 @@
+from piece import Pharaoh, Sphynx, action
+from board import Board, MoveUndo, print_move
+from laser import LASER_OUTCOMES, PIECE_TYPES, get_ray_table, trace
+from zobrist import raw_piece_key
+from movegen import get_move_tables, generate_moves, move_position, move_action as code_action
+
+# Every square is one byte: 0 when empty, otherwise
+# 1 + (color * NUM_TYPES + type) * 4 + orientation
+COLORS = ["Silver", "Red"]
+NUM_TYPES = len(PIECE_TYPES)
+EMPTY = 0
+
+def encode_piece(piece):
+    if piece is None:
+        return EMPTY
+    return 1 + (COLORS.index(piece.color) * NUM_TYPES + piece.type_index) * 4 + piece.orientation
+
+def _build_code_tables():
+    code_color = [None]
+    code_type = [None]
+    code_orientation = [None]
+    code_laser = [None]
+    for color in COLORS:
+        for piece_class in PIECE_TYPES:
+            for orientation in range(4):
+                code_color.append(color)
+                code_type.append(piece_class)
+                code_orientation.append(orientation)
+                code_laser.append(LASER_OUTCOMES[piece_class.type_index][orientation])
+    return code_color, code_type, code_orientation, code_laser
+
+CODE_COLOR, CODE_TYPE, CODE_ORIENTATION, CODE_LASER = _build_code_tables()
+CODE_COLOR_INDEX = [None] + [COLORS.index(color) for color in CODE_COLOR[1:]]
+CODE_TYPE_INDEX = [None] + [piece_class.type_index for piece_class in CODE_TYPE[1:]]
+
+class CompactBoard:
+    # Same interface as Board, backed by a flat bytearray of m * n squares.
+    # Pieces handed out by get_grid_position and the move generator are
+    # detached copies, the bytearray is the only state.
+    def __init__(self, m=10, n=8, cells=None):
+        self.m = m
+        self.n = n
+        self.cells = bytearray(m * n) if cells is None else bytearray(cells)
+        self.ray_table = get_ray_table(m, n)
+        self.move_tables = get_move_tables(m, n)
+        self.laser_cache = {}
+        self.zobrist_hash = 0
+        self.occupancy = 0
+        self.color_occupancy = [0, 0]
+        # Square of each color's Sphynx and Pharaoh, indexed by color index
+        self.sphynx_squares = [None, None]
+        self.pharaoh_squares = [None, None]
+        for square, code in enumerate(self.cells):
+            if code != EMPTY:
+                self.zobrist_hash ^= self.code_key(code, square)
+                self.occupancy |= 1 << square
+                self.color_occupancy[CODE_COLOR_INDEX[code]] |= 1 << square
+                self.track_code(code, square)
+
+    @classmethod
+    def from_board(cls, board):
+        compact_board = cls(m=board.m, n=board.n)
+        for piece in board.get_list_of_pieces():
+            compact_board.set_grid_position(piece, piece.position)
+        return compact_board
+
+    @classmethod
+    def unpack(cls, data, m=10, n=8):
+        return cls(m=m, n=n, cells=data)
+
+    def pack(self):
+        return bytes(self.cells)
+
+    def to_board(self):
+        return Board(m=self.m, n=self.n, list_of_pieces=self.get_list_of_pieces())
+
+    def code_key(self, code, square):
+        y, x = divmod(square, self.m)
+        return raw_piece_key(COLORS.index(CODE_COLOR[code]), CODE_TYPE[code].type_index, CODE_ORIENTATION[code], x, y)
+
+    def decode_piece(self, code, square):
+        if code == EMPTY:
+            return None
+        y, x = divmod(square, self.m)
+        return CODE_TYPE[code](CODE_COLOR[code], (x, y), CODE_ORIENTATION[code])
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactBoard):
+            return False
+        return self.m == other.m and self.n == other.n and self.cells == other.cells
+
+    def __hash__(self):
+        return self.zobrist_hash
+
+    def deepcopy(self):
+        new_board = CompactBoard.__new__(CompactBoard)
+        new_board.m = self.m
+        new_board.n = self.n
+        new_board.cells = bytearray(self.cells)
+        new_board.ray_table = self.ray_table
+        new_board.move_tables = self.move_tables
+        new_board.color_occupancy = list(self.color_occupancy)
+        new_board.sphynx_squares = list(self.sphynx_squares)
+        new_board.pharaoh_squares = list(self.pharaoh_squares)
+        new_board.zobrist_hash = self.zobrist_hash
+        new_board.occupancy = self.occupancy
+        new_board.laser_cache = dict(self.laser_cache)
+        return new_board
+
+    def display(self):
+        for y in range(self.n):
+            row = self.cells[y * self.m:(y + 1) * self.m]
+            print(" ".join([str(self.decode_piece(code, 0)) if code != EMPTY else '.' for code in row]))
+
+    def find_piece(self, color, piece_class):
+        start = 1 + (COLORS.index(color) * NUM_TYPES + piece_class.type_index) * 4
+        for code in range(start, start + 4):
+            square = self.cells.find(code)
+            if square != -1:
+                return square
+        return None
+
+    def is_pharoh_destroyed(self, color):
+        return self.pharaoh_squares[COLORS.index(color)] is None
+
+    def get_pharaoh_position(self, color):
+        square = self.pharaoh_squares[COLORS.index(color)]
+        if square is None:
+            return None
+        return self.ray_table.positions[square]
+
+    def get_sphynx(self, color):
+        square = self.sphynx_squares[COLORS.index(color)]
+        if square is None:
+            return None
+        return self.decode_piece(self.cells[square], square)
+
+    def track_code(self, code, square):
+        type_index = CODE_TYPE_INDEX[code]
+        if type_index == Sphynx.type_index:
+            self.sphynx_squares[CODE_COLOR_INDEX[code]] = square
+        elif type_index == Pharaoh.type_index:
+            self.pharaoh_squares[CODE_COLOR_INDEX[code]] = square
+
+    def untrack_code(self, code, square):
+        # A piece that has already been placed elsewhere keeps its entry
+        type_index = CODE_TYPE_INDEX[code]
+        color_index = CODE_COLOR_INDEX[code]
+        if type_index == Sphynx.type_index and self.sphynx_squares[color_index] == square:
+            self.sphynx_squares[color_index] = None
+        elif type_index == Pharaoh.type_index and self.pharaoh_squares[color_index] == square:
+            self.pharaoh_squares[color_index] = None
+
+    def trace_laser(self, color, record_path=False):
+        laser_path = self.laser_cache.get(color)
+        if laser_path is None or (record_path and laser_path.path is None):
+            square = self.sphynx_squares[COLORS.index(color)]
+            if square is None:
+                return None, None
+            laser_path = trace(self.ray_table, self.occupancy, self.laser_outcome, square, CODE_ORIENTATION[self.cells[square]], record_path)
+            self.laser_cache[color] = laser_path
+        return laser_path.path, laser_path.hit_square
+
+    def invalidate_laser_paths(self, square):
+        if self.laser_cache:
+            bit = 1 << square
+            for color in [color for color, laser_path in self.laser_cache.items() if laser_path.mask & bit]:
+                del self.laser_cache[color]
+
+    def laser_outcome(self, square, direction):
+        return CODE_LASER[self.cells[square]][direction]
+
+    def fire_laser(self, color):
+        _, hit_square = self.trace_laser(color)
+        if hit_square is None:
+            return None
+        hit_position = self.ray_table.positions[hit_square]
+        hit_piece = self.get_grid_position(hit_position)
+        self.set_grid_position(None, hit_position)
+        return hit_piece
+
+    def get_actionable_spaces(self, color):
+        path, _ = self.trace_laser(color, record_path=True)
+        if path is None:
+            return None
+        return list(path)
+
+    def get_list_of_pieces(self):
+        return [self.decode_piece(code, square) for square, code in enumerate(self.cells) if code != EMPTY]
+
+    def get_grid_position(self, position):
+        x, y = position
+        square = y * self.m + x
+        return self.decode_piece(self.cells[square], square)
+
+    def set_grid_position(self, piece, position):
+        self.set_code(encode_piece(piece), position)
+        if piece is not None:
+            piece.set_position(position)
+
+    def set_code(self, code, position):
+        x, y = position
+        square = y * self.m + x
+        self.invalidate_laser_paths(square)
+        bit = 1 << square
+        old_code = self.cells[square]
+        if old_code != EMPTY:
+            self.zobrist_hash ^= self.code_key(old_code, square)
+            self.color_occupancy[CODE_COLOR_INDEX[old_code]] &= ~bit
+            self.untrack_code(old_code, square)
+        self.cells[square] = code
+        if code != EMPTY:
+            self.zobrist_hash ^= self.code_key(code, square)
+            self.occupancy |= bit
+            self.color_occupancy[CODE_COLOR_INDEX[code]] |= bit
+            self.track_code(code, square)
+        else:
+            self.occupancy &= ~bit
+
+    def piece_at(self, square):
+        code = self.cells[square]
+        return CODE_TYPE_INDEX[code], CODE_ORIENTATION[code]
+
+    def get_code(self, position):
+        x, y = position
+        return self.cells[y * self.m + x]
+
+    def rotate_piece(self, position, dtheta):
+        code = self.get_code(position)
+        self.orient_piece(position, CODE_ORIENTATION[code] + dtheta)
+
+    def orient_piece(self, position, orientation):
+        code = self.get_code(position)
+        piece = CODE_TYPE[code](CODE_COLOR[code], position, orientation)
+        self.set_code(encode_piece(piece), position)
+
+    def check_move(self, move):
+        piece, move_action = move
+        if piece is None:
+            return move_action == action.PASS
+        return self.check_code_move(self.get_code(piece.position), piece.position, move_action)
+
+    def check_code_move(self, code, position, move_action):
+        piece_class = CODE_TYPE[code]
+        if move_action not in piece_class.allowed_moves:
+            return False
+
+        if piece_class is Sphynx:
+            # Sphinxes toggle between two orientations, matching Board.check_move
+            orientation = CODE_ORIENTATION[code]
+            if move_action == action.ROTATE_CW:
+                return orientation not in (0, 2)
+            return orientation not in (1, 3)
+
+        dx, dy, dtheta = move_action.value
+        if dtheta != 0:
+            return True
+
+        x, y = position
+        new_position = (x + dx, y + dy)
+        if not (0 <= new_position[0] < self.m and 0 <= new_position[1] < self.n):
+            return False
+
+        # Same forbidden squares as the move generator
+        target = new_position[1] * self.m + new_position[0]
+        if (self.move_tables.forbidden[CODE_COLOR_INDEX[code]] >> target) & 1:
+            return False
+
+        next_code = self.get_code(new_position)
+        if next_code == EMPTY:
+            return True
+        return piece_class.can_initiate_swap and CODE_TYPE[next_code].can_be_swapped
+
+    def list_possible_moves(self, piece):
+        code = self.get_code(piece.position)
+        return [move_action for move_action in piece.allowed_moves if self.check_code_move(code, piece.position, move_action)]
+
+    def get_all_possible_moves(self, color):
+        # One detached piece per square, shared by all of its moves
+        pieces = {}
+        possible_moves = []
+        for move in generate_moves(self, color):
+            position = move_position(move)
+            if position is None:
+                possible_moves.append((None, action.PASS))
+                continue
+            piece = pieces.get(position)
+            if piece is None:
+                piece = pieces[position] = self.get_grid_position(position)
+            possible_moves.append((piece, code_action(move)))
+        return possible_moves
+
+    def generate_moves(self, color):
+        return generate_moves(self, color)
+
+    def make_move(self, move, check_allowed=True):
+        if check_allowed == True and self.check_move(move) == False:
+            print_move(move)
+            raise Exception("Invalid move")
+        new_board = self.deepcopy()
+        new_board.move_piece(move)
+        return new_board
+
+    def move_piece(self, move):
+        # Returns the code of the piece that was swapped out of the way
+        piece, move_action = move
+        if piece is None or move_action == action.PASS:
+            return EMPTY
+
+        dx, dy, dtheta = move_action.value
+        x, y = piece.position
+        if dtheta != 0:
+            self.rotate_piece((x, y), dtheta)
+            return EMPTY
+
+        new_position = (x + dx, y + dy)
+        code = self.get_code((x, y))
+        next_code = self.get_code(new_position)
+        self.set_code(code, new_position)
+        self.set_code(next_code, (x, y))
+        return next_code
+
+    def apply_move(self, move, color, check_allowed=False):
+        if check_allowed == True and self.check_move(move) == False:
+            print_move(move)
+            raise Exception("Invalid move")
+        piece, move_action = move
+        code = EMPTY
+        old_position = None
+        old_orientation = None
+        if piece is not None:
+            old_position = piece.position
+            code = self.get_code(old_position)
+            old_orientation = CODE_ORIENTATION[code]
+
+        swapped_code = self.move_piece(move)
+        piece_destroyed = self.fire_laser(color)
+        destroyed_position = piece_destroyed.position if piece_destroyed is not None else None
+        return MoveUndo(code, move_action, old_position, old_orientation, swapped_code, piece_destroyed, destroyed_position)
+
+    def undo_move(self, undo):
+        if undo.piece_destroyed is not None:
+            self.set_code(encode_piece(undo.piece_destroyed), undo.destroyed_position)
+
+        if undo.piece == EMPTY or undo.action == action.PASS:
+            return
+
+        dx, dy, dtheta = undo.action.value
+        if dtheta != 0:
+            self.set_code(undo.piece, undo.old_position)
+            return
+
+        x, y = undo.old_position
+        self.set_code(undo.piece, undo.old_position)
+        self.set_code(undo.swapped_piece, (x + dx, y + dy))
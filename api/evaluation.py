@@ -0,0 +1,96 @@
+import json
+import math
+import os
+from piece import Pharaoh, Anubis, Pyramid, Scarab
+
+DEFAULT_WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_weights.json")
+
+# Every feature is computed as (player's side) - (opponent's side)
+FEATURES = [
+    "anubis",           # material per piece type
+    "pyramid",
+    "scarab",
+    "laser_exposure",   # opponent pieces on our beam minus ours on theirs
+    "pharaoh_exposure", # squares around the opponent pharaoh our beam crosses, minus the same for ours
+    "mobility",         # number of legal moves
+]
+
+MATERIAL_TYPES = {"anubis": Anubis, "pyramid": Pyramid, "scarab": Scarab}
+
+DEFAULT_WEIGHTS = {
+    "anubis": 1.0,
+    "pyramid": 1.5,
+    "scarab": 0.5,
+    "laser_exposure": 0.5,
+    "pharaoh_exposure": 1.0,
+    "mobility": 0.0,
+}
+
+class Evaluator:
+    # Scores a non-terminal position for player_color. The weighted sum is
+    # squashed into (-max_value, max_value) so that it can never outrank a
+    # forced win, which is worth win_reward / depth.
+    def __init__(self, weights=None, scale=10.0, max_value=1.0):
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown evaluation features: {sorted(unknown)}")
+        self.weights = [weights.get(feature, 0.0) for feature in FEATURES]
+        self.scale = scale
+        self.max_value = max_value
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_WEIGHTS_FILE):
+        with open(path) as weights_file:
+            config = json.load(weights_file)
+        return cls(config["weights"], config.get("scale", 10.0), config.get("max_value", 1.0))
+
+    @classmethod
+    def load_default(cls):
+        if os.path.exists(DEFAULT_WEIGHTS_FILE):
+            return cls.from_file(DEFAULT_WEIGHTS_FILE)
+        return cls()
+
+    def features(self, board, player_color):
+        opponent_color = "Silver" if player_color == "Red" else "Red"
+        pieces = board.get_list_of_pieces()
+
+        values = []
+        for feature in FEATURES[:3]:
+            piece_class = MATERIAL_TYPES[feature]
+            values.append(sum(1 if piece.color == player_color else -1 for piece in pieces if isinstance(piece, piece_class)))
+
+        player_beam = set(board.get_actionable_spaces(player_color) or [])
+        opponent_beam = set(board.get_actionable_spaces(opponent_color) or [])
+        exposure = 0
+        for piece in pieces:
+            if piece.color == player_color and piece.position in opponent_beam:
+                exposure -= 1
+            elif piece.color == opponent_color and piece.position in player_beam:
+                exposure += 1
+        values.append(exposure)
+
+        pharaoh_exposure = 0
+        for piece in pieces:
+            if isinstance(piece, Pharaoh):
+                beam = player_beam if piece.color == opponent_color else opponent_beam
+                sign = 1 if piece.color == opponent_color else -1
+                x, y = piece.position
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        if (x + dx, y + dy) in beam:
+                            pharaoh_exposure += sign
+        values.append(pharaoh_exposure)
+
+        # Move generation is the expensive part, skip it when it does not count
+        if self.weights[FEATURES.index("mobility")] != 0:
+            values.append(len(board.generate_moves(player_color)) - len(board.generate_moves(opponent_color)))
+        else:
+            values.append(0)
+
+        return values
+
+    def evaluate(self, board, player_color):
+        raw_value = sum(weight * value for weight, value in zip(self.weights, self.features(board, player_color)))
+        return self.max_value * math.tanh(raw_value / self.scale)
@@ -0,0 +1,162 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from board import format_move
+
+class job_state(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+FINISHED_STATES = (job_state.DONE, job_state.FAILED, job_state.CANCELLED)
+
+class Job:
+    # A solve running in the JobManager's pool. Progress is written by the
+    # search thread and read by request threads, every change bumps version
+    # and wakes up wait_for_update.
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.state = job_state.QUEUED
+        self.created = time.monotonic()
+        self.finished = None
+        self.depth = 0
+        self.value = None
+        self.best_line = []
+        self.result = None
+        self.status_code = None
+        self.session_id = None
+        self.positions = None # batch jobs, number of positions and how many are done
+        self.positions_done = 0
+        self.error = None
+        self.solver = None
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.version = 0
+
+    def update(self, **fields):
+        with self.condition:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if self.state in FINISHED_STATES and self.finished is None:
+                self.finished = time.monotonic()
+            self.version += 1
+            self.condition.notify_all()
+
+    def watch(self, solver):
+        # Reports the solver's progress and lets cancel stop its search
+        self.solver = solver
+        solver.stop_event = self.stop_event
+        solver.progress_callback = self.record_progress
+
+    def unwatch(self, solver):
+        solver.stop_event = None
+        solver.progress_callback = None
+
+    def record_progress(self, depth, nodes_searched, principal_variation):
+        best_line = [format_move(pv_node.move) for pv_node, _ in principal_variation[1:]]
+        self.update(depth=depth, value=principal_variation[0][1], best_line=best_line)
+
+    def cancel(self):
+        self.stop_event.set()
+        if self.state == job_state.QUEUED:
+            self.update(state=job_state.CANCELLED)
+
+    def is_finished(self):
+        return self.state in FINISHED_STATES
+
+    def nodes_searched(self):
+        # Read while the search runs, so polls see it grow between depths
+        return self.solver.nodes_searched if self.solver is not None else 0
+
+    def wait_for_update(self, version, timeout):
+        # Blocks until the job changes after version or timeout passes
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version or self.is_finished(), timeout)
+            return self.version, self.snapshot()
+
+    def snapshot(self):
+        status = {
+            "job_id": self.job_id,
+            "state": self.state.value,
+            "depth": self.depth,
+            "nodes": self.nodes_searched(),
+            "value": self.value,
+            "best_line": self.best_line,
+            "elapsed_ms": int(((self.finished or time.monotonic()) - self.created) * 1000),
+        }
+        if self.positions is not None:
+            status["positions"] = self.positions
+            status["positions_done"] = self.positions_done
+        if self.result is not None:
+            status["result"] = self.result
+        if self.session_id is not None:
+            status["session_id"] = self.session_id
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+class JobManager:
+    # Runs solves on a thread pool so requests can return straight away.
+    # Finished jobs are kept for ttl_seconds, and at most max_finished of them.
+    def __init__(self, max_workers=2, ttl_seconds=10 * 60, max_finished=256):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solve-job")
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, run):
+        # run(job) returns (body, status code, session id) like a request handler
+        job = Job(uuid.uuid4().hex)
+        with self.lock:
+            self.prune()
+            self.jobs[job.job_id] = job
+        self.executor.submit(self.run_job, job, run)
+        return job
+
+    def run_job(self, job, run):
+        if job.stop_event.is_set():
+            return
+        job.update(state=job_state.RUNNING)
+        try:
+            body, status_code, session_id = run(job)
+        except Exception as e:
+            job.update(state=job_state.FAILED, error=str(e))
+            return
+        if job.stop_event.is_set():
+            # A cancelled deepening search still leaves its last completed depth
+            state = job_state.CANCELLED
+        elif status_code == 200:
+            state = job_state.DONE
+        else:
+            state = job_state.FAILED
+        if status_code == 200:
+            job.update(state=state, result=body, status_code=status_code, session_id=session_id)
+        else:
+            job.update(state=state, error=body.get("error"), status_code=status_code)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def prune(self):
+        # Caller holds self.lock
+        now = time.monotonic()
+        finished = [job for job in self.jobs.values() if job.is_finished()]
+        for i, job in enumerate(finished):
+            if now - job.finished > self.ttl_seconds or i < len(finished) - self.max_finished:
+                del self.jobs[job.job_id]
+
+    def __len__(self):
+        return len(self.jobs)
@@ -0,0 +1,118 @@
+from piece import Pharaoh, Anubis, Pyramid, Scarab, Sphynx, action, surface
+
+# Beam directions, a Sphynx with orientation i fires in DIRECTIONS[i]
+DIRECTIONS = [action.NORTH, action.EAST, action.SOUTH, action.WEST]
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+# Outcomes other than a reflected direction
+LASER_STOP = -1 # blocked, or hit an emitting side
+LASER_HIT = -2  # piece is destroyed
+
+PIECE_TYPES = [Pharaoh, Anubis, Pyramid, Scarab, Sphynx]
+
+def _build_outcome_table():
+    # LASER_OUTCOMES[type_index][orientation][direction index] for a beam
+    # travelling in that direction into the piece
+    table = []
+    for piece_class in PIECE_TYPES:
+        by_orientation = []
+        for orientation in range(4):
+            piece = piece_class("Silver", (0, 0), orientation)
+            outcomes = []
+            for direction in DIRECTIONS:
+                surface_hit = piece.get_surface_hit(direction)
+                if surface_hit == surface.BLOCKER or surface_hit == surface.EMIT_LASER:
+                    outcomes.append(LASER_STOP)
+                elif surface_hit == surface.REFLECT_CW or surface_hit == surface.REFLECT_CCW:
+                    outcomes.append(DIRECTION_INDEX[piece.reflect_laser(direction)])
+                else:
+                    outcomes.append(LASER_HIT)
+            by_orientation.append(outcomes)
+        table.append(by_orientation)
+    return table
+
+LASER_OUTCOMES = _build_outcome_table()
+
+class Ray:
+    def __init__(self, mask, squares, positions):
+        self.mask = mask           # bitmask of the squares on the ray
+        self.squares = squares     # squares in travel order
+        self.positions = positions # (x, y) in travel order plus the first position off the board
+        self.index = {square: i for i, square in enumerate(squares)}
+
+class RayTable:
+    # rays[square][direction index] for every square of an m x n board,
+    # squares are numbered y * m + x
+    def __init__(self, m, n):
+        self.m = m
+        self.n = n
+        self.positions = [(square % m, square // m) for square in range(m * n)]
+        self.rays = []
+        for square in range(m * n):
+            x0, y0 = self.positions[square]
+            rays_from_square = []
+            for direction in DIRECTIONS:
+                dx, dy, _ = direction.value
+                x, y = x0 + dx, y0 + dy
+                mask = 0
+                squares = []
+                positions = []
+                while 0 <= x < m and 0 <= y < n:
+                    mask |= 1 << (y * m + x)
+                    squares.append(y * m + x)
+                    positions.append((x, y))
+                    x, y = x + dx, y + dy
+                positions.append((x, y))
+                rays_from_square.append(Ray(mask, squares, positions))
+            self.rays.append(rays_from_square)
+
+_ray_tables = {}
+
+def get_ray_table(m, n):
+    ray_table = _ray_tables.get((m, n))
+    if ray_table is None:
+        ray_table = RayTable(m, n)
+        _ray_tables[(m, n)] = ray_table
+    return ray_table
+
+class LaserPath:
+    # Result of one trace, valid until a square in mask changes
+    def __init__(self, hit_square, mask, path):
+        self.hit_square = hit_square
+        self.mask = mask
+        self.path = path
+
+def trace(ray_table, occupancy, outcome_at, square, direction, record_path=False):
+    # Follows the beam from square, jumping straight to the next occupied
+    # square on each ray. outcome_at(square, direction) looks up
+    # LASER_OUTCOMES for the piece there. Returns a LaserPath with the square
+    # of the destroyed piece, the mask of every square the beam depends on
+    # (including the emitter) and optionally the positions
+    # get_actionable_spaces reports.
+    path = [] if record_path else None
+    mask = 1 << square
+    while True:
+        ray = ray_table.rays[square][direction]
+        bits = occupancy & ray.mask
+        if not bits:
+            if record_path:
+                path.extend(ray.positions)
+            return LaserPath(None, mask | ray.mask, path)
+
+        # North and East rays run towards higher squares, South and West lower
+        if direction < 2:
+            target = (bits & -bits).bit_length() - 1
+            mask |= ray.mask & ((2 << target) - 1)
+        else:
+            target = bits.bit_length() - 1
+            mask |= ray.mask & ~((1 << target) - 1)
+        if record_path:
+            path.extend(ray.positions[:ray.index[target] + 1])
+
+        outcome = outcome_at(target, direction)
+        if outcome == LASER_STOP:
+            return LaserPath(None, mask, path)
+        if outcome == LASER_HIT:
+            return LaserPath(target, mask, path)
+        square = target
+        direction = outcome
@@ -0,0 +1,93 @@
+from movegen import PASS_MOVE, encode_move, move_position, move_action
+
+# Score tiers, each tier outranks everything below it
+TT_MOVE_SCORE = 1000000
+LASER_MOVE_SCORE = 100000
+KILLER_MOVE_SCORE = 10000
+MAX_HISTORY_SCORE = 8999
+
+def move_key(move):
+    # Move code of a (Piece, action) tuple, independent of the Piece object
+    # so it survives board copies
+    piece, piece_action = move
+    if piece is None:
+        return PASS_MOVE
+    return encode_move(piece.position, piece_action)
+
+def touches_laser(move, laser_squares):
+    # Moving onto, off or rotating a piece on a beam changes where it goes
+    position = move_position(move)
+    if position is None:
+        return False
+    if position in laser_squares:
+        return True
+    dx, dy, _ = move_action(move).value
+    x, y = position
+    return (x + dx, y + dy) in laser_squares
+
+def default_move_score(orderer, move, color, ply, tt_move, laser_squares):
+    # PASS stays last, see Solver.prefer_line
+    if move == PASS_MOVE:
+        return -1
+    score = 0
+    if move == tt_move:
+        score += TT_MOVE_SCORE
+    if touches_laser(move, laser_squares):
+        score += LASER_MOVE_SCORE
+    killers = orderer.killers.get(ply)
+    if killers is not None and move in killers:
+        score += KILLER_MOVE_SCORE - killers.index(move)
+    score += min(orderer.history.get((color, move), 0), MAX_HISTORY_SCORE)
+    return score
+
+class MoveOrderer:
+    killer_slots = 2
+
+    def __init__(self, score_move=default_move_score):
+        # score_move(orderer, move, color, ply, tt_move, laser_squares) -> number,
+        # higher scores are searched first. Moves are move codes from movegen.
+        self.score_move = score_move
+        self.killers = {}  # ply -> most recent cutoff moves, newest first
+        self.history = {}  # (color, move) -> accumulated depth^2 of cutoffs
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def laser_squares(self, board):
+        laser_squares = set()
+        for color in ("Silver", "Red"):
+            spaces = board.get_actionable_spaces(color)
+            if spaces is not None:
+                laser_squares.update(spaces)
+        return laser_squares
+
+    def order(self, board, possible_moves, color, ply, tt_move=None):
+        laser_squares = self.laser_squares(board)
+        scored_moves = []
+        for i, move in enumerate(possible_moves):
+            # Negated so that ties keep the generator's order
+            scored_moves.append((-self.score_move(self, move, color, ply, tt_move, laser_squares), i, move))
+        scored_moves.sort(key=lambda scored_move: (scored_move[0], scored_move[1]))
+        return [move for _, _, move in scored_moves]
+
+    def record_cutoff(self, move, color, ply, depth, move_number):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+
+        killers = self.killers.setdefault(ply, [])
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.killer_slots:]
+
+        self.history[(color, move)] = self.history.get((color, move), 0) + depth * depth
+
+    def first_move_cutoff_rate(self):
+        if self.cutoffs == 0:
+            return 0
+        return self.first_move_cutoffs / self.cutoffs
+
+    def new_search(self):
+        # Killers belong to one tree, history is kept but aged
+        self.killers = {}
+        self.history = {key: score // 2 for key, score in self.history.items() if score > 1}
@@ -0,0 +1,133 @@
+from piece import Sphynx, action
+from laser import PIECE_TYPES
+from zobrist import COLOR_INDEX, MAX_BOARD_WIDTH
+
+# A move is one integer, (y * MAX_BOARD_WIDTH + x) * NUM_ACTION_SLOTS + action index.
+# Coordinates use the zobrist grid width so that codes do not depend on the
+# board they came from.
+ACTIONS = list(action)
+ACTION_INDEX = {move_action: i for i, move_action in enumerate(ACTIONS)}
+NUM_ACTION_SLOTS = 16
+PASS_MOVE = ACTION_INDEX[action.PASS]
+
+STEP_ACTIONS = [move_action for move_action in ACTIONS if move_action.value[2] == 0 and move_action != action.PASS]
+ROTATE_ACTIONS = [action.ROTATE_CW, action.ROTATE_CCW]
+
+def encode_move(position, move_action):
+    if position is None:
+        return PASS_MOVE
+    x, y = position
+    return (y * MAX_BOARD_WIDTH + x) * NUM_ACTION_SLOTS + ACTION_INDEX[move_action]
+
+def move_position(move):
+    if move == PASS_MOVE:
+        return None
+    location = move // NUM_ACTION_SLOTS
+    return (location % MAX_BOARD_WIDTH, location // MAX_BOARD_WIDTH)
+
+def move_action(move):
+    return ACTIONS[move % NUM_ACTION_SLOTS]
+
+def _build_piece_tables():
+    # Per piece type the step actions it may take and, per orientation, the
+    # rotations, both in the order of the class's allowed_moves
+    step_actions = []
+    rotate_actions = []
+    for piece_class in PIECE_TYPES:
+        step_actions.append([ACTION_INDEX[move_action] for move_action in piece_class.allowed_moves if move_action in STEP_ACTIONS])
+        by_orientation = []
+        for orientation in range(4):
+            rotations = []
+            for move_action in piece_class.allowed_moves:
+                if move_action not in ROTATE_ACTIONS:
+                    continue
+                # Sphinxes only turn between facing into the board and along it
+                if piece_class is Sphynx and move_action == action.ROTATE_CW and orientation in (0, 2):
+                    continue
+                if piece_class is Sphynx and move_action == action.ROTATE_CCW and orientation in (1, 3):
+                    continue
+                rotations.append(ACTION_INDEX[move_action])
+            by_orientation.append(rotations)
+        rotate_actions.append(by_orientation)
+    can_initiate_swap = [piece_class.can_initiate_swap for piece_class in PIECE_TYPES]
+    can_be_swapped = [piece_class.can_be_swapped for piece_class in PIECE_TYPES]
+    return step_actions, rotate_actions, can_initiate_swap, can_be_swapped
+
+PIECE_STEP_ACTIONS, PIECE_ROTATE_ACTIONS, CAN_INITIATE_SWAP, CAN_BE_SWAPPED = _build_piece_tables()
+
+class MoveTables:
+    # Board geometry for the move generator, squares are y * m + x
+    def __init__(self, m, n):
+        self.m = m
+        self.n = n
+        # neighbors[square][action index] is the destination square, -1 off the board
+        self.neighbors = []
+        # move code of action index 0 from each square
+        self.move_base = []
+        for square in range(m * n):
+            y, x = divmod(square, m)
+            targets = [-1] * len(ACTIONS)
+            for move_action in STEP_ACTIONS:
+                dx, dy, _ = move_action.value
+                if 0 <= x + dx < m and 0 <= y + dy < n:
+                    targets[ACTION_INDEX[move_action]] = (y + dy) * m + x + dx
+            self.neighbors.append(targets)
+            self.move_base.append(encode_move((x, y), ACTIONS[0]))
+
+        # Squares each color may not move onto, indexed by COLOR_INDEX
+        self.forbidden = [0, 0]
+        for y in range(n):
+            self.forbidden[COLOR_INDEX["Silver"]] |= 1 << (y * m)
+            self.forbidden[COLOR_INDEX["Red"]] |= 1 << (y * m + m - 1)
+        for y in (0, n - 1):
+            self.forbidden[COLOR_INDEX["Silver"]] |= 1 << (y * m + m - 2)
+            self.forbidden[COLOR_INDEX["Red"]] |= 1 << (y * m + 1)
+
+_move_tables = {}
+
+def get_move_tables(m, n):
+    move_tables = _move_tables.get((m, n))
+    if move_tables is None:
+        move_tables = MoveTables(m, n)
+        _move_tables[(m, n)] = move_tables
+    return move_tables
+
+def generate_moves(board, color):
+    # Legal moves for color as move codes, in the same order as
+    # Board.get_all_possible_moves used to list them, PASS last. The board
+    # provides move_tables, occupancy, color_occupancy and piece_at(square).
+    move_tables = board.move_tables
+    neighbors = move_tables.neighbors
+    move_base = move_tables.move_base
+    color_index = COLOR_INDEX[color]
+    forbidden = move_tables.forbidden[color_index]
+    occupancy = board.occupancy
+
+    moves = []
+    pieces = board.color_occupancy[color_index]
+    while pieces:
+        lowest = pieces & -pieces
+        pieces ^= lowest
+        square = lowest.bit_length() - 1
+        type_index, orientation = board.piece_at(square)
+        base = move_base[square]
+        targets = neighbors[square]
+        for action_index in PIECE_STEP_ACTIONS[type_index]:
+            target = targets[action_index]
+            if target < 0 or (forbidden >> target) & 1:
+                continue
+            if (occupancy >> target) & 1:
+                if not CAN_INITIATE_SWAP[type_index] or not CAN_BE_SWAPPED[board.piece_at(target)[0]]:
+                    continue
+            moves.append(base + action_index)
+        for action_index in PIECE_ROTATE_ACTIONS[type_index][orientation]:
+            moves.append(base + action_index)
+    moves.append(PASS_MOVE)
+    return moves
+
+def decode_move(board, move):
+    # (Piece, action) tuple for a move code on board
+    position = move_position(move)
+    if position is None:
+        return (None, action.PASS)
+    return (board.get_grid_position(position), move_action(move))
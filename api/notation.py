@@ -0,0 +1,85 @@
+from piece import Pharaoh, Anubis, Pyramid, Scarab, Sphynx
+from board import Board, parse_board_data
+
+# A board in one line, FEN style: ranks from the top (y = n - 1) down,
+# separated by "/", digits count empty squares. A piece is its letter,
+# upper case for Silver and lower case for Red, followed by its
+# orientation as one of ^ > v < (0 to 3, as in Piece.orientation).
+# An optional " s" or " r" after the board gives the side to move.
+#   X  Sphinx    P  Pharaoh    A  Anubis    Y  Pyramid    S  Scarab
+PIECE_LETTERS = {Sphynx: "X", Pharaoh: "P", Anubis: "A", Pyramid: "Y", Scarab: "S"}
+LETTER_PIECES = {letter: piece_class for piece_class, letter in PIECE_LETTERS.items()}
+ORIENTATIONS = "^>v<"
+SIDE_LETTERS = {"Silver": "s", "Red": "r"}
+LETTER_SIDES = {letter: color for color, letter in SIDE_LETTERS.items()}
+
+def board_to_fen(board, color=None):
+    ranks = []
+    for y in range(board.n - 1, -1, -1):
+        rank = ""
+        empty = 0
+        for x in range(board.m):
+            piece = board.get_grid_position((x, y))
+            if piece is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = PIECE_LETTERS[piece.__class__]
+            rank += (letter if piece.color == "Silver" else letter.lower()) + ORIENTATIONS[piece.orientation]
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    fen = "/".join(ranks)
+    if color is not None:
+        fen += " " + SIDE_LETTERS[color]
+    return fen
+
+def parse_fen(fen):
+    # (Board, side to move or None), ValueError when fen is malformed
+    fields = fen.split()
+    if len(fields) not in (1, 2):
+        raise ValueError(f"Expected a board and an optional side to move, got {len(fields)} fields")
+    color = None
+    if len(fields) == 2:
+        if fields[1] not in LETTER_SIDES:
+            raise ValueError(f"Unknown side to move '{fields[1]}'")
+        color = LETTER_SIDES[fields[1]]
+
+    ranks = fields[0].split("/")
+    n = len(ranks)
+    m = None
+    list_of_pieces = []
+    for i, rank in enumerate(ranks):
+        y = n - i - 1
+        x = 0
+        j = 0
+        while j < len(rank):
+            if rank[j].isdigit():
+                start = j
+                while j < len(rank) and rank[j].isdigit():
+                    j += 1
+                x += int(rank[start:j])
+                continue
+            piece_class = LETTER_PIECES.get(rank[j].upper())
+            if piece_class is None or j + 1 >= len(rank) or rank[j + 1] not in ORIENTATIONS:
+                raise ValueError(f"Bad piece '{rank[j:j + 2]}' in rank {i}")
+            piece_color = "Silver" if rank[j].isupper() else "Red"
+            list_of_pieces.append(piece_class(piece_color, (x, y), ORIENTATIONS.index(rank[j + 1])))
+            x += 1
+            j += 2
+        if m is None:
+            m = x
+        elif x != m:
+            raise ValueError(f"Rank {i} has {x} squares, expected {m}")
+    if not m:
+        raise ValueError("Empty board")
+    return Board(m=m, n=n, list_of_pieces=list_of_pieces), color
+
+def read_board(board_data):
+    # (Board, side to move or None) from the UI's grid of cell strings or a
+    # notation string
+    if isinstance(board_data, str):
+        return parse_fen(board_data)
+    return parse_board_data(board_data), None
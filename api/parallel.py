@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from compact_board import CompactBoard
+from move_ordering import move_key
+from movegen import decode_move
+from solver import Solver, TreeNode
+
+# Best root score found so far by any worker. Every node a worker searches
+# narrows its window to it (see Solver.shared_window), and a worker raises it
+# when its root move does better.
+_shared_bound = None
+
+def _init_worker(shared_bound):
+    global _shared_bound
+    _shared_bound = shared_bound
+
+def _search_root_move(task):
+    packed_board, m, n, root_depth, player_color, is_max, root_move, depth = task
+    board = CompactBoard.unpack(packed_board, m, n)
+    solver = Solver(board, player_color, search_depth=depth)
+    solver.root.depth = root_depth
+    solver.shared_bound = _shared_bound
+    solver.shared_bound_is_max = is_max
+    turn_color = player_color if is_max else solver.opponent_color
+
+    piece, move_action = decode_move(board, root_move)
+    child_board = board.make_move((piece, move_action), check_allowed=False)
+    piece_destroyed = child_board.fire_laser(turn_color)
+    child_node = TreeNode(child_board, solver.root, (piece, move_action), piece_destroyed, turn_color)
+
+    value = solver.alphabeta(child_node, depth - 1, -float('inf'), float('inf'), not is_max)
+
+    # Otherwise value is only a bound, the move is no better than one already found
+    with _shared_bound.get_lock():
+        improved = (is_max and value > _shared_bound.value) or (not is_max and value < _shared_bound.value)
+        if improved:
+            _shared_bound.value = value
+
+    line = [(root_move, value)]
+    current_node = child_node
+    while current_node.best_child is not None:
+        current_node = current_node.best_child
+        line.append((move_key(current_node.move), current_node.value))
+    return line, solver.num_nodes_searched(), improved
+
+def get_worker_pool(solver, max_workers):
+    # One pool per Solver, the shared bound is reset for every search
+    if solver.worker_pool is None:
+        solver.worker_bound = multiprocessing.Value('d', 0.0)
+        solver.worker_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(solver.worker_bound,))
+    return solver.worker_pool
+
+def search_root_parallel(solver, node, depth, is_max, max_workers=None):
+    # Splits the root moves of node across a process pool and merges the
+    # results into node.value and node.best_child, like Solver.alphabeta
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    turn_color = solver.player_color if is_max else solver.opponent_color
+    board = node.board
+    possible_moves = solver.move_orderer.order(board, board.generate_moves(turn_color), turn_color, node.depth)
+
+    packed_board = CompactBoard.from_board(board).pack()
+    tasks = [(packed_board, board.m, board.n, node.depth, solver.player_color, is_max, move, depth) for move in possible_moves]
+
+    pool = get_worker_pool(solver, max_workers)
+    with solver.worker_bound.get_lock():
+        solver.worker_bound.value = -float('inf') if is_max else float('inf')
+    results = list(pool.map(_search_root_move, tasks))
+
+    value = -float('inf') if is_max else float('inf')
+    node.best_child = None
+    for line, nodes_searched, improved in results:
+        solver.nodes_searched += nodes_searched
+        if not improved:
+            continue
+        child_node = solver.attach_line(node, line, is_max)
+        child_value = child_node.value
+        if (is_max and child_value > value) or (not is_max and child_value < value):
+            node.best_child = child_node
+            value = child_value
+        elif child_value == value and solver.prefer_line(child_node, node.best_child):
+            node.best_child = child_node
+
+    node.value = value
+    return value
@@ -43,10 +43,16 @@ def parse_piece_str(piece_str):
     return (color, piece, orientation)
 
 class Piece:
+    # Only color, position and orientation live on the instance. The rest
+    # comes from the subclass and is shared by every piece of that type:
+    # symbol, allowed_moves, the swap rules, type_index and
+    # surfaces[orientation] = (N, E, S, W) with one entry per distinct orientation.
+    __slots__ = ("color", "position", "orientation")
+
     def __init__(self, color, position, orientation=0):
         self.color = color
         self.position = position
-        self.orientation = orientation
+        self.set_orientation(orientation)
 
     def __str__(self):
         return self.symbol
@@ -63,7 +69,11 @@ class Piece:
         return hash((self.color, self.position, self.orientation, self.symbol))
     
     def deepcopy(self):
-        new_piece = self.__class__(self.color, self.position, self.orientation)
+        # Skips __init__, the orientation is already normalized
+        new_piece = object.__new__(self.__class__)
+        new_piece.color = self.color
+        new_piece.position = self.position
+        new_piece.orientation = self.orientation
         return new_piece
     
     def move(self, action):
@@ -74,12 +84,29 @@ class Piece:
             self.rotate_cw() if dtheta == 1 else self.rotate_ccw()
 
     def rotate_cw(self):
-        self.orientation = self.orientation + 1
-        self.set_orientation(self.orientation)
+        self.set_orientation(self.orientation + 1)
 
     def rotate_ccw(self):
-        self.orientation = self.orientation - 1
-        self.set_orientation(self.orientation)
+        self.set_orientation(self.orientation - 1)
+
+    def set_orientation(self, orientation=0):
+        self.orientation = orientation % len(self.surfaces)
+
+    @property
+    def side_N(self):
+        return self.surfaces[self.orientation][0]
+
+    @property
+    def side_E(self):
+        return self.surfaces[self.orientation][1]
+
+    @property
+    def side_S(self):
+        return self.surfaces[self.orientation][2]
+
+    @property
+    def side_W(self):
+        return self.surfaces[self.orientation][3]
 
     def check_allowed_move(self, move):
         if move not in self.allowed_moves:
@@ -93,44 +120,18 @@ class Piece:
         return self.position
     
     def get_surface_hit(self, direction):
-        surface_hit = None
-
-        if direction == action.NORTH:
-            surface_hit = self.side_S
-        elif direction == action.EAST:
-            surface_hit = self.side_W
-        elif direction == action.SOUTH:
-            surface_hit = self.side_N
-        elif direction == action.WEST:
-            surface_hit = self.side_E
-
-        return surface_hit
+        side = SIDE_HIT.get(direction)
+        if side is None:
+            return None
+        return self.surfaces[self.orientation][side]
     
     def reflect_laser(self, direction):
-        new_direction = None
-
-        if direction == action.NORTH:
-            if self.side_S == surface.REFLECT_CW:
-                new_direction = action.WEST
-            elif self.side_S == surface.REFLECT_CCW:
-                new_direction = action.EAST
-        elif direction == action.EAST:
-            if self.side_W == surface.REFLECT_CW:
-                new_direction = action.NORTH
-            elif self.side_W == surface.REFLECT_CCW:
-                new_direction = action.SOUTH
-        elif direction == action.SOUTH:
-            if self.side_N == surface.REFLECT_CW:
-                new_direction = action.EAST
-            elif self.side_N == surface.REFLECT_CCW:
-                new_direction = action.WEST
-        elif direction == action.WEST:
-            if self.side_E == surface.REFLECT_CW:
-                new_direction = action.SOUTH
-            elif self.side_E == surface.REFLECT_CCW:
-                new_direction = action.NORTH
-        
-        return new_direction
+        surface_hit = self.get_surface_hit(direction)
+        if surface_hit == surface.REFLECT_CW:
+            return REFLECT_CW_DIRECTION[direction]
+        if surface_hit == surface.REFLECT_CCW:
+            return REFLECT_CCW_DIRECTION[direction]
+        return None
 
         
 
@@ -156,125 +157,75 @@ class action(Enum): # (dx,dy, dtheta)
 
     __str__ = lambda self: self.name
 
+# Side of a piece (index into its surfaces) that a beam travelling in a direction hits
+SIDE_HIT = {action.NORTH: 2, action.EAST: 3, action.SOUTH: 0, action.WEST: 1}
+REFLECT_CW_DIRECTION = {action.NORTH: action.WEST, action.EAST: action.NORTH, action.SOUTH: action.EAST, action.WEST: action.SOUTH}
+REFLECT_CCW_DIRECTION = {action.NORTH: action.EAST, action.EAST: action.SOUTH, action.SOUTH: action.WEST, action.WEST: action.NORTH}
+
 class Pharaoh(Piece):
+    __slots__ = ()
+    symbol = 'Pharoh'
     allowed_moves = [action.NORTH, action.NORTH_EAST, action.EAST, action.SOUTH_EAST, action.SOUTH, action.SOUTH_WEST, action.WEST, action.NORTH_WEST]
     can_initiate_swap = False
     can_be_swapped = False
-
-    def __init__(self, color, position, orientation=0):
-        super().__init__(color, position)
-        self.symbol = 'Pharoh'
-        self.can_swap = False
-        self.set_orientation()
-
-    def set_orientation(self):
-        self.orientation = 0
-        self.side_N = surface.VUNERABLE
-        self.side_E = surface.VUNERABLE
-        self.side_S = surface.VUNERABLE
-        self.side_W = surface.VUNERABLE
+    type_index = 0
+    surfaces = [
+        (surface.VUNERABLE, surface.VUNERABLE, surface.VUNERABLE, surface.VUNERABLE),
+    ]
 
 class Anubis(Piece):
+    __slots__ = ()
+    symbol = 'Anubis'
     allowed_moves = [action.NORTH, action.NORTH_EAST, action.EAST, action.SOUTH_EAST, action.SOUTH, action.SOUTH_WEST, action.WEST, action.NORTH_WEST, action.ROTATE_CW, action.ROTATE_CCW]
     can_initiate_swap = False
     can_be_swapped = True
-
-    def __init__(self, color, position, orientation=0):
-        super().__init__(color, position)
-        self.symbol = 'Anubis'
-        self.set_orientation(orientation)
-
-    def set_orientation(self,orientation):
-        self.orientation = orientation % 4
-        if(self.orientation == 0):
-            self.side_N = surface.BLOCKER
-            self.side_E = surface.VUNERABLE
-            self.side_S = surface.VUNERABLE
-            self.side_W = surface.VUNERABLE
-        elif(self.orientation == 1):
-            self.side_N = surface.VUNERABLE
-            self.side_E = surface.BLOCKER
-            self.side_S = surface.VUNERABLE
-            self.side_W = surface.VUNERABLE
-        elif(self.orientation == 2):
-            self.side_N = surface.VUNERABLE
-            self.side_E = surface.VUNERABLE
-            self.side_S = surface.BLOCKER
-            self.side_W = surface.VUNERABLE
-        elif(self.orientation == 3):
-            self.side_N = surface.VUNERABLE
-            self.side_E = surface.VUNERABLE
-            self.side_S = surface.VUNERABLE
-            self.side_W = surface.BLOCKER
+    type_index = 1
+    surfaces = [
+        (surface.BLOCKER, surface.VUNERABLE, surface.VUNERABLE, surface.VUNERABLE),
+        (surface.VUNERABLE, surface.BLOCKER, surface.VUNERABLE, surface.VUNERABLE),
+        (surface.VUNERABLE, surface.VUNERABLE, surface.BLOCKER, surface.VUNERABLE),
+        (surface.VUNERABLE, surface.VUNERABLE, surface.VUNERABLE, surface.BLOCKER),
+    ]
 
 class Pyramid(Piece):
+    __slots__ = ()
+    symbol = 'Pyramid'
     allowed_moves = [action.NORTH, action.NORTH_EAST, action.EAST, action.SOUTH_EAST, action.SOUTH, action.SOUTH_WEST, action.WEST, action.NORTH_WEST, action.ROTATE_CW, action.ROTATE_CCW]
     can_initiate_swap = False
     can_be_swapped = True
-
-    def __init__(self, color, position, orientation):
-        super().__init__(color, position)
-        self.symbol = 'Pyramid'
-        self.set_orientation(orientation)
-        self.can_swap = False
-
-    def set_orientation(self,orientation):
-        self.orientation = orientation % 4
-        if(self.orientation == 0):
-            self.side_N = surface.REFLECT_CW
-            self.side_E = surface.REFLECT_CCW
-            self.side_S = surface.VUNERABLE
-            self.side_W = surface.VUNERABLE
-        elif(self.orientation == 1):
-            self.side_N = surface.VUNERABLE
-            self.side_E = surface.REFLECT_CW
-            self.side_S = surface.REFLECT_CCW
-            self.side_W = surface.VUNERABLE
-        elif(self.orientation == 2):
-            self.side_N = surface.VUNERABLE
-            self.side_E = surface.VUNERABLE
-            self.side_S = surface.REFLECT_CW
-            self.side_W = surface.REFLECT_CCW
-        elif(self.orientation == 3):
-            self.side_N = surface.REFLECT_CCW
-            self.side_E = surface.VUNERABLE
-            self.side_S = surface.VUNERABLE
-            self.side_W = surface.REFLECT_CW
+    type_index = 2
+    surfaces = [
+        (surface.REFLECT_CW, surface.REFLECT_CCW, surface.VUNERABLE, surface.VUNERABLE),
+        (surface.VUNERABLE, surface.REFLECT_CW, surface.REFLECT_CCW, surface.VUNERABLE),
+        (surface.VUNERABLE, surface.VUNERABLE, surface.REFLECT_CW, surface.REFLECT_CCW),
+        (surface.REFLECT_CCW, surface.VUNERABLE, surface.VUNERABLE, surface.REFLECT_CW),
+    ]
 
 class Scarab(Piece):
+    __slots__ = ()
+    symbol = 'Scarab'
     allowed_moves = [action.NORTH, action.NORTH_EAST, action.EAST, action.SOUTH_EAST, action.SOUTH, action.SOUTH_WEST, action.WEST, action.NORTH_WEST, action.ROTATE_CW]
     can_initiate_swap = True
     can_be_swapped = False
-
-    def __init__(self, color, position, orientation):
-        super().__init__(color, position)
-        self.symbol = 'Scarab'
-        self.set_orientation(orientation)
-
-    def set_orientation(self,orientation):
-        self.orientation = orientation % 2
-        if(self.orientation == 0):
-            self.side_N = surface.REFLECT_CW
-            self.side_E = surface.REFLECT_CCW
-            self.side_S = surface.REFLECT_CW
-            self.side_W = surface.REFLECT_CCW
-        elif(self.orientation == 1):
-            self.side_N = surface.REFLECT_CCW
-            self.side_E = surface.REFLECT_CW
-            self.side_S = surface.REFLECT_CCW
-            self.side_W = surface.REFLECT_CW 
+    type_index = 3
+    surfaces = [
+        (surface.REFLECT_CW, surface.REFLECT_CCW, surface.REFLECT_CW, surface.REFLECT_CCW),
+        (surface.REFLECT_CCW, surface.REFLECT_CW, surface.REFLECT_CCW, surface.REFLECT_CW),
+    ]
 
 class Sphynx(Piece):
+    __slots__ = ()
+    symbol = 'Sphynx'
     allowed_moves = [action.ROTATE_CW, action.ROTATE_CCW]
     can_initiate_swap = False
     can_be_swapped = False
-
-
-    def __init__(self, color, position, orientation):
-        super().__init__(color, position)
-        self.symbol = 'Sphynx'
-        self.can_swap = False
-        self.set_orientation(orientation)
+    type_index = 4
+    surfaces = [
+        (surface.EMIT_LASER, surface.BLOCKER, surface.BLOCKER, surface.BLOCKER),
+        (surface.BLOCKER, surface.EMIT_LASER, surface.BLOCKER, surface.BLOCKER),
+        (surface.BLOCKER, surface.BLOCKER, surface.EMIT_LASER, surface.BLOCKER),
+        (surface.BLOCKER, surface.BLOCKER, surface.BLOCKER, surface.EMIT_LASER),
+    ]
 
     def get_laser_direction(self):
         if self.orientation == 0:
@@ -285,26 +236,3 @@ class Sphynx(Piece):
             return action.SOUTH
         elif self.orientation == 3:
             return action.WEST
-
-    def set_orientation(self, orientation):
-        self.orientation = orientation % 4
-        if(self.orientation == 0):
-            self.side_N = surface.EMIT_LASER
-            self.side_E = surface.BLOCKER
-            self.side_S = surface.BLOCKER
-            self.side_W = surface.BLOCKER
-        elif(self.orientation == 1):
-            self.side_N = surface.BLOCKER
-            self.side_E = surface.EMIT_LASER
-            self.side_S = surface.BLOCKER
-            self.side_W = surface.BLOCKER
-        elif(self.orientation == 2):
-            self.side_N = surface.BLOCKER
-            self.side_E = surface.BLOCKER
-            self.side_S = surface.EMIT_LASER
-            self.side_W = surface.BLOCKER
-        elif(self.orientation == 3):
-            self.side_N = surface.BLOCKER
-            self.side_E = surface.BLOCKER
-            self.side_S = surface.BLOCKER
-            self.side_W = surface.EMIT_LASER
@@ -0,0 +1,113 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger("khet.search")
+
+# Board and solver methods timed when a Solver profiles its searches
+BOARD_PHASES = ["generate_moves", "apply_move", "undo_move", "fire_laser"]
+
+class SearchStats:
+    # Counters for one Solver.search call. Counting is always on, the phase
+    # timers wrap methods with timed() and only run when profiling.
+    def __init__(self, solver, profile=False):
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.source = "search" # or "book" / "tablebase" when no search ran
+        self.depth = 0
+        self.nodes_per_ply = [] # children created at each ply below the search root
+        self.iterations = [] # (depth, nodes, seconds) per completed deepening iteration
+        self.interior_nodes = 0 # nodes whose moves were generated and searched
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.phase_times = {phase: 0.0 for phase in BOARD_PHASES + ["eval"]} if profile else None
+        # The solver's own counters run across searches, these are deltas
+        self.solver = solver
+        self.start_counters = self.counters()
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.researches = 0
+
+    def counters(self):
+        table = self.solver.transposition_table
+        return (self.solver.nodes_searched, table.probes, table.hits, self.solver.researches)
+
+    def update(self):
+        self.nodes, self.tt_probes, self.tt_hits, self.researches = [now - start for now, start in zip(self.counters(), self.start_counters)]
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.update()
+
+    def count_node(self, ply):
+        if ply >= len(self.nodes_per_ply):
+            self.nodes_per_ply.extend([0] * (ply + 1 - len(self.nodes_per_ply)))
+        self.nodes_per_ply[ply] += 1
+
+    def count_cutoff(self, move_number):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+
+    def effective_branching_factor(self):
+        # Growth between the last two iterations when deepening, otherwise
+        # the branching factor a uniform tree of this size and depth would have
+        if len(self.iterations) >= 2 and self.iterations[-2][1] > 0:
+            return self.iterations[-1][1] / self.iterations[-2][1]
+        if self.depth > 0 and self.nodes > 0:
+            return self.nodes ** (1 / self.depth)
+        return None
+
+    def phase_ms(self):
+        if self.phase_times is None:
+            return None
+        phase_times = self.phase_times
+        # apply_move fires the laser, the rest of it and undo_move is the move itself
+        return {
+            "movegen": phase_times["generate_moves"] * 1000,
+            "make_move": (phase_times["apply_move"] + phase_times["undo_move"] - phase_times["fire_laser"]) * 1000,
+            "fire_laser": phase_times["fire_laser"] * 1000,
+            "eval": phase_times["eval"] * 1000,
+        }
+
+    def to_dict(self):
+        if self.elapsed is None:
+            # Still searching
+            self.update()
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        nodes = self.nodes
+        return {
+            "source": self.source,
+            "depth": self.depth,
+            "nodes": nodes,
+            "elapsed_ms": elapsed * 1000,
+            "nodes_per_second": nodes / elapsed if elapsed > 0 else None,
+            "nodes_per_ply": self.nodes_per_ply,
+            "iterations": [{"depth": depth, "nodes": iteration_nodes, "elapsed_ms": seconds * 1000} for depth, iteration_nodes, seconds in self.iterations],
+            "effective_branching_factor": self.effective_branching_factor(),
+            "beta_cutoff_rate": self.cutoffs / self.interior_nodes if self.interior_nodes else None,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else None,
+            "tt_hit_rate": self.tt_hits / self.tt_probes if self.tt_probes else None,
+            "tt_probes": self.tt_probes,
+            "researches": self.researches,
+            "phase_ms": self.phase_ms(),
+        }
+
+    def log(self, **fields):
+        # One JSON object per search on the khet.search logger
+        logger.info(json.dumps({"event": "search", **fields, **self.to_dict()}))
+
+def timed(solver, phase, function):
+    # function, adding its running time to the solver's current stats
+    def timed_function(*args):
+        start = time.perf_counter()
+        result = function(*args)
+        solver.stats.phase_times[phase] += time.perf_counter() - start
+        return result
+    return timed_function
+
+def profile_board(solver, board):
+    # Shadows the board's own methods, board copies are not affected
+    for phase in BOARD_PHASES:
+        setattr(board, phase, timed(solver, phase, getattr(board, phase)))
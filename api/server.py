@@ -1,20 +1,72 @@
+import json
+import logging
+import os
 import time
-from flask import Flask, request
+from flask import Flask, Response, request
 from solver import *
 from board import *
+from sessions import SolverRegistry
+from book import Book
+from tablebase import Tablebase
+from jobs import JobManager, job_state, FINISHED_STATES
+from notation import read_board, board_to_fen
+from batch import analyze_batch, read_time_ms, read_search_depth, MAX_SEARCH_DEPTH
 
 
 app = Flask(__name__)
 
-global solver
-solver = None
+DEFAULT_SEARCH_DEPTH = 6
+RETAIN_PLY = 2 # tree plies kept between requests, deeper nodes are dropped as the search unwinds
+SEARCH_WORKERS = int(os.environ.get('KHET_SEARCH_WORKERS', 1)) # processes for fixed depth solves
+JOB_WORKERS = int(os.environ.get('KHET_JOB_WORKERS', 2)) # solves running at once for async requests
+JOB_STREAM_INTERVAL = 1.0 # seconds between stream events while a depth is searched
+BATCH_WORKERS = int(os.environ.get('KHET_BATCH_WORKERS', 1)) # processes for /api/solve-batch
+MAX_BATCH_POSITIONS = 256
+PROFILE_SEARCH = os.environ.get('KHET_PROFILE_SEARCH') == '1' # phase timers in the search stats
+
+# Every search logs its stats as one JSON line on the khet.search logger
+logging.basicConfig(level=os.environ.get('KHET_LOG_LEVEL', 'INFO'), format='%(message)s')
+
+SESSION_HEADER = 'X-Session-Id'
+
+# Built offline with book.py and tablebase.py, the server searches when they are
+# missing. The tablebase only knows small positions reachable from the boards it
+# was built from, the bundled puzzles by default, anything else is searched.
+book = Book.load_default()
+tablebase = Tablebase.load_default()
+
+registry = SolverRegistry()
+jobs = JobManager(max_workers=JOB_WORKERS)
+
+def get_session_id(data):
+    return data.get('session_id') or request.headers.get(SESSION_HEADER)
 
 @app.route('/api/next-best-move', methods=['POST'])
 def next_best_move():
     data = request.json
     move_data = data['move']
 
-    global solver
+    session_id = get_session_id(data)
+    if session_id:
+        session = registry.get(session_id)
+    else:
+        # Clients that predate sessions can only play while there is one game
+        session = registry.only_session()
+        if session is None and len(registry) > 1:
+            return {"error": "Missing session id"}, 400
+    if session is None:
+        return {"error": "Unknown session"}, 404
+
+    with session.lock:
+        session.solver.stop_pondering()
+        body, status = play_next_best_move(session.solver, move_data)
+        if status == 200:
+            # Search the likely replies while the player is thinking
+            session.solver.start_pondering()
+    registry.trim()
+    return body, status, {SESSION_HEADER: session.session_id}
+
+def play_next_best_move(solver, move_data):
     previous_known_node = solver.current_node
 
     received_move = None
@@ -40,10 +92,7 @@ def next_best_move():
     print("Next best move:")
     print_move(next_best_move)
     
-    optimal_move_piece, optimal_move_action = next_best_move
-    r, c = optimal_move_piece.position
-    move_str = f"{r},{c},{optimal_move_action}"
-    return move_str
+    return format_move(next_best_move), 200
 
 @app.route('/api/solve', methods=['POST'])
 def solve():
@@ -51,29 +100,150 @@ def solve():
     board_data = data['board']
 
     try:
-        board = parse_board_data(board_data)
+        board, color = read_board(board_data)
     except Exception as e:
         return {"error": "Invalid board"}, 400
+    if color == "Red":
+        return {"error": "The solver plays Silver"}, 400
 
-    global solver    
-    if solver is None or solver.root.board != board:
-        solver = Solver(board, "Silver", debug=False, search_depth=6)
+    try:
+        time_ms = read_time_ms(data)
+    except ValueError:
+        return {"error": "Invalid time_ms"}, 400
+    search_depth = MAX_SEARCH_DEPTH if time_ms is not None else DEFAULT_SEARCH_DEPTH
+
+    session_id = get_session_id(data)
+    if data.get('async'):
+        # Answer straight away, the client follows the job at /api/jobs/<id>
+        job = jobs.submit(lambda job: solve_board(board, time_ms, search_depth, session_id, job))
+        return {"job_id": job.job_id, "status_url": f"/api/jobs/{job.job_id}"}, 202
+
+    body, status, session_id = solve_board(board, time_ms, search_depth, session_id)
+    if status != 200:
+        return body, status
+    return body, {SESSION_HEADER: session_id}
+
+def solve_board(board, time_ms, search_depth, session_id, job=None):
+    # (body, status, session id) for a solve, job is set when it runs in the pool
+    session = registry.get(session_id) if session_id else None
+    if session is not None and session.solver.root.board == board and session.solver.time_ms == time_ms:
+        with session.lock:
+            session.solver.stop_pondering()
+            solution = session.solver.get_solution(session.solver.root)
+            session.solver.current_node = session.solver.root
+    else:
+        solver = Solver(board, "Silver", debug=False, search_depth=search_depth, time_ms=time_ms, workers=SEARCH_WORKERS, retain_ply=RETAIN_PLY, book=book, tablebase=tablebase, profile=PROFILE_SEARCH)
+        if job is not None:
+            job.watch(solver)
         try:
             solution = solver.solve_multi_agent(solver.root)
         except Exception as e:
-            return {"error": "No solution found"}, 404
-    else:
-        solution = solver.get_solution(solver.root)
+            return {"error": "No solution found"}, 404, None
+        finally:
+            if job is not None:
+                job.unwatch(solver)
+        solver.current_node = solver.root
+        session = registry.create(solver, session_id)
 
-    solver.current_node = solver.root
     print_moves(solution)
 
     solution_str = ""
     for move in solution:
         piece, action = move
         if piece is None:
-            return {"error": "No solution found"}, 404
-        r, c = piece.position
-        move_str = f"{r},{c},{action}"
-        solution_str += move_str + "\n"
-    return solution_str
\ No newline at end of file
+            return {"error": "No solution found"}, 404, None
+        solution_str += format_move(move) + "\n"
+    return solution_str, 200, session.session_id
+
+@app.route('/api/solve-batch', methods=['POST'])
+def solve_batch():
+    # Best move, value and line for every position, positions in either board
+    # format. Runs as a job, its result is {"results": [...]} and no sessions
+    # are created. A cancelled job keeps the results of the positions done.
+    data = request.json
+    positions = data.get('positions')
+    if not isinstance(positions, list) or not positions:
+        return {"error": "No positions"}, 400
+    if len(positions) > MAX_BATCH_POSITIONS:
+        return {"error": f"At most {MAX_BATCH_POSITIONS} positions per request"}, 400
+
+    try:
+        time_ms = read_time_ms(data)
+    except ValueError:
+        return {"error": "Invalid time_ms"}, 400
+    try:
+        search_depth = read_search_depth(data, DEFAULT_SEARCH_DEPTH if time_ms is None else MAX_SEARCH_DEPTH)
+    except ValueError:
+        return {"error": "Invalid depth"}, 400
+
+    tasks = []
+    for i, board_data in enumerate(positions):
+        try:
+            board, color = read_board(board_data)
+        except Exception as e:
+            return {"error": f"Invalid board at index {i}"}, 400
+        tasks.append((board_to_fen(board), color or "Silver", search_depth, time_ms))
+
+    job = jobs.submit(lambda job: solve_positions(tasks, job))
+    job.update(positions=len(tasks))
+    return {"job_id": job.job_id, "status_url": f"/api/jobs/{job.job_id}"}, 202
+
+def solve_positions(tasks, job):
+    # (body, status, session id) for a batch job
+    def record_result(results):
+        job.update(positions_done=len(results))
+    results = analyze_batch(tasks, BATCH_WORKERS, record_result, job.stop_event)
+    return {"results": results}, 200, None
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    # Stats of a session's last search, and of its pondering when that came after
+    session_id = request.args.get('session_id') or request.headers.get(SESSION_HEADER)
+    session = registry.get(session_id) if session_id else registry.only_session()
+    if session is None and not session_id and len(registry) > 1:
+        return {"error": "Missing session id"}, 400
+    if session is None:
+        return {"error": "Unknown session"}, 404
+    solver = session.solver
+    body = {
+        "session_id": session.session_id,
+        "search": solver.search_stats.to_dict(),
+        "sessions": len(registry),
+        "memory_estimate": registry.memory_estimate(),
+    }
+    ponder_stats = solver.stats
+    if ponder_stats is not solver.search_stats:
+        body["ponder"] = ponder_stats.to_dict()
+    return body
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job"}, 404
+    return job.snapshot()
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def job_stream(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job"}, 404
+
+    def events():
+        # One event per change, and the node count every JOB_STREAM_INTERVAL
+        # seconds while nothing else changes
+        version = None
+        while True:
+            version, status = job.wait_for_update(version, JOB_STREAM_INTERVAL)
+            yield f"data: {json.dumps(status)}\n\n"
+            if job_state(status["state"]) in FINISHED_STATES:
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return {"error": "Unknown job"}, 404
+    return job.snapshot(), 202
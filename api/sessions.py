@@ -0,0 +1,108 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Rough per-object costs used to keep the registry under its memory cap
+TREE_NODE_BYTES = 700
+TT_ENTRY_BYTES = 200
+
+class Session:
+    def __init__(self, session_id, solver):
+        self.session_id = session_id
+        self.solver = solver
+        self.created = time.monotonic()
+        self.last_used = self.created
+        # Requests for the same game run one at a time
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.solver.close()
+
+    def memory_estimate(self):
+        return (self.solver.nodes_retained * TREE_NODE_BYTES +
+                self.solver.transposition_table.num_entries * TT_ENTRY_BYTES)
+
+class SolverRegistry:
+    # Keeps one Solver per game, least recently used first. Sessions are
+    # dropped when idle for longer than ttl_seconds, and the least recently
+    # used ones when there are more than max_sessions or their estimated
+    # memory goes over max_memory_bytes.
+    def __init__(self, max_sessions=64, ttl_seconds=30 * 60, max_memory_bytes=1 << 30):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self, solver, session_id=None):
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        session = Session(session_id, solver)
+        with self.lock:
+            self.drop(session_id)
+            self.sessions[session_id] = session
+            self.evict(keep=session_id)
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_used > self.ttl_seconds:
+                self.drop(session_id)
+                return None
+            session.last_used = time.monotonic()
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def only_session(self):
+        # The session when there is exactly one, for clients that do not send
+        # an id. With several games there is no telling which one they mean.
+        with self.lock:
+            if len(self.sessions) != 1:
+                return None
+            session_id = next(iter(self.sessions))
+        return self.get(session_id)
+
+    def remove(self, session_id):
+        with self.lock:
+            return self.drop(session_id)
+
+    def memory_estimate(self):
+        with self.lock:
+            return self.total_memory()
+
+    def total_memory(self):
+        # Caller holds self.lock
+        return sum(session.memory_estimate() for session in self.sessions.values())
+
+    def trim(self):
+        # Sessions grow as games go on, callers check the limits after each request
+        with self.lock:
+            self.evict()
+
+    def evict(self, keep=None):
+        # Caller holds self.lock
+        now = time.monotonic()
+        for session_id in [session_id for session_id, session in self.sessions.items() if now - session.last_used > self.ttl_seconds]:
+            if session_id != keep:
+                self.drop(session_id)
+
+        for session_id in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions and self.total_memory() <= self.max_memory_bytes:
+                break
+            if session_id != keep:
+                self.drop(session_id)
+
+    def drop(self, session_id):
+        # Caller holds self.lock
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def __len__(self):
+        return len(self.sessions)
@@ -1,17 +1,53 @@
 
 
+import heapq
+import math
 import sys
+import threading
+import time
+from enum import Enum
 from piece import Pharaoh
 from board import Board, parse_board_data, print_moves, print_move
+from compact_board import CompactBoard
 from collections import deque
+from transposition import TranspositionTable, bound, replacement
+from zobrist import side_key, ply_key
+from move_ordering import MoveOrderer, move_key
+from movegen import decode_move
+from evaluation import Evaluator
+from search_stats import SearchStats, timed, profile_board
 import os
-import networkx as nx
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+class SearchTimeout(Exception):
+    pass
+
+class search_mode(Enum):
+    ALPHABETA = 1 # every child searched with the full window
+    PVS = 2       # children after the first are scouted with a null window
+
+# Width of a null window, values are floats so there is no "next" integer
+PVS_EPSILON = 1e-9
+
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
 
 
 class Solver:
     win_reward = 100
 
-    def __init__(self, starting_board, player_color, debug = False, search_depth=6):
+    time_check_interval = 256 # nodes between deadline checks
+    ponder_replies = 4 # opponent replies searched while waiting for a move
+    ponder_extra_depth = 2 # plies pondering goes past the normal search depth
+
+    def __init__(self, starting_board, player_color, debug = False, search_depth=6, tt_size=1 << 18, tt_replacement=replacement.DEPTH_PREFERRED, time_ms=None, move_orderer=None, evaluator=None, workers=1, retain_ply=None, mode=search_mode.ALPHABETA, aspiration_window=None, book=None, tablebase=None, profile=False):
         self.starting_board = starting_board
         self.player_color = player_color
         self.root = TreeNode(starting_board)
@@ -19,13 +55,58 @@ class Solver:
         self.debug = debug
         self.current_node = self.root
         self.search_depth = search_depth
+        self.transposition_table = TranspositionTable(tt_size, tt_replacement)
+        self.move_orderer = move_orderer if move_orderer is not None else MoveOrderer()
+        self.evaluator = evaluator if evaluator is not None else Evaluator.load_default()
+        self.nodes_searched = 0
+        self.search_root = None
+        self.board = None
+        self.time_ms = time_ms
+        self.deadline = None
+        self.nodes_until_time_check = self.time_check_interval
+        self.pv_hint = {}
+        self.completed_depth = 0
+        self.stop_event = None
+        self.ponder_thread = None
+        # Called with (depth, nodes searched, principal variation) after each
+        # depth iterative deepening completes, searches deepen iteratively
+        # while one is set
+        self.progress_callback = None
+        self.workers = workers # processes for the root split, 1 searches in this process
+        self.worker_pool = None # the root split's process pool, kept until close()
+        self.worker_bound = None # its multiprocessing.Value, see parallel.py
+        # Set in root split workers (parallel.py), the best root score any
+        # worker has found so far and whether the root maximizes
+        self.shared_bound = None
+        self.shared_bound_is_max = True
+        # Plies below the search root whose children stay attached for reuse,
+        # None keeps the whole tree. Deeper nodes only survive on a best_child line.
+        self.retain_ply = retain_ply
+        self.nodes_retained = 0 # tree size below root, recounted after each search
+        self.mode = mode
+        # Half width of the window around the previous depth's score when
+        # deepening, None always searches with the full window
+        self.aspiration_window = aspiration_window
+        self.researches = 0
+        self.book = book # consulted before every search, see book.py
+        self.tablebase = tablebase # exact results for small positions reachable from its boards, see tablebase.py
+        # Time movegen, make_move, fire_laser and eval into the stats, costs
+        # a few percent of search speed
+        self.profile = profile
+        if profile:
+            self.grade_board = timed(self, "eval", self.grade_board)
+        self.stats = SearchStats(self, profile) # whatever is searching now, pondering included
+        self.search_stats = self.stats # the last search() call
         TreeNode.reset_visited()
 
-    def solve_single_agent(self, debug = False):
+    def solve_single_agent(self, debug = False, heuristic=False):
         TreeNode.reset_visited()
 
 
-        winning_node = self.find_winning_node_single_agent()
+        winning_node = self.find_winning_node_single_agent(heuristic)
+        if winning_node is None:
+            print("No winning line found")
+            return []
 
         winning_moves = deque()
         current_node = winning_node
@@ -38,43 +119,40 @@ class Solver:
         if debug:
             print("Winning moves:")
             print_moves(winning_moves_list)
-            winning_node.board.display_board()
-        num_visited = TreeNode.num_nodes_made()
-        print(f"Numer of visited nodes: {num_visited}")
+            # Search nodes do not keep their boards, replay the line instead
+            board = self.root.board
+            for move in winning_moves_list:
+                board = board.make_move(move, check_allowed=False)
+                board.fire_laser(self.player_color)
+            board.display_board()
+        stats = self.single_agent_stats
+        print(f"Expanded {stats['expanded']} positions, visited {stats['visited']}, largest frontier {stats['max_frontier']}, solution depth {stats['depth']}")
         return winning_moves_list
 
     def solve_multi_agent(self, node, debug = False):
-        # Create the root node
-
-        #self.minimax(self.root, True, search_depth)
-        self.alphabeta(node, self.search_depth, -float('inf'), float('inf'), True)
-        current_node = node
-        print(f"Value: {current_node.value}")
-        move_list = []
-        while current_node.best_child is not None:
-            current_node = current_node.best_child
-            move_list.append(current_node.move)
-            print(f"Value: {current_node.value}")
-
-        return move_list
+        self.search(node, True)
+        return self.get_solution(node)
     
     def get_solution(self, node):
         current_node = node
-        print(f"Value: {current_node.value}")
+        if self.debug:
+            print(f"Value: {current_node.value}")
         move_list = []
         while current_node.best_child is not None:
             current_node = current_node.best_child
             move_list.append(current_node.move)
-            print(f"Value: {current_node.value}")
+            if self.debug:
+                print(f"Value: {current_node.value}")
 
         return move_list
     
     def get_next_best_move(self, received_move):
+        self.stop_pondering()
         # Handle the case where no move is received
         if received_move is None:
             # If no move is received, make the first optimal move for Silver
             if self.current_node.best_child is None:
-                self.alphabeta(self.current_node, self.search_depth, -float('inf'), float('inf'), True)
+                self.search(self.current_node, True)
             next_node = self.current_node.best_child
             next_best_move = next_node.move
 
@@ -88,6 +166,10 @@ class Solver:
 
         if received_move in self.current_node.children:
             active_node = self.current_node.get_child(received_move)
+            if active_node.pondered_depth is not None and active_node.pondered_depth >= self.reply_search_depth(active_node):
+                # Searched while the opponent was thinking, its value is exact
+                self.current_node = active_node.best_child
+                return self.current_node.move
         else:
             active_board = self.current_node.board.make_move(received_move, check_allowed=True)
             turn_color = received_move[0].color
@@ -96,17 +178,19 @@ class Solver:
                 active_board,
                 self.current_node,
                 received_move,
-                piece_destroyed
+                piece_destroyed,
+                turn_color
             )
-            depth_remaining = self.search_depth - active_node.depth
-            self.alphabeta(active_node, depth_remaining, -float('inf'), float('inf'), isMax)
+            self.search(active_node, isMax)
 
         # Check for blunders
         optimal_value = previous_node.best_child.value
         if optimal_value != active_node.value:
             print("Blunder Detected")
-            depth_remaining = self.search_depth - active_node.depth
-            self.alphabeta(active_node, depth_remaining, -float('inf'), float('inf'), isMax)
+            self.search(active_node, isMax)
+        elif active_node.best_child is None:
+            # The line below this node was cut short by a transposition table hit
+            self.search(active_node, isMax)
 
         # Determine the next move
         next_node = active_node.best_child
@@ -117,6 +201,11 @@ class Solver:
         return next_best_move
             
     def minimax(self, node, is_max, search_depth):
+        self.search_root = node
+        self.board = node.board.deepcopy()
+        return self._minimax(node, is_max, search_depth)
+
+    def _minimax(self, node, is_max, search_depth):
         turn_color = self.player_color if is_max else self.opponent_color
 
         if node.depth == search_depth or isinstance(node.piece_destroyed, Pharaoh):
@@ -124,23 +213,22 @@ class Solver:
             return node.value
 
         # Expand the current node
-        possible_moves=node.board.get_all_possible_moves(turn_color)
+        possible_moves=self.board.generate_moves(turn_color)
         if is_max:
             node.value = -float('inf')
         else:
             node.value = float('inf')
 
         for move in possible_moves:
-            child_board = node.board.make_move(move, check_allowed=True)
-            piece_destroyed = child_board.fire_laser(turn_color)
+            child_node, undo = self.expand_child(node, move, turn_color)
 
             #if TreeNode.is_visited(child_board):
                 #continue
             
-            child_node = TreeNode(child_board, node, move, piece_destroyed)
-            node.add_child(child_node, move)
+            node.add_child(child_node, child_node.move)
             
-            current_value = self.minimax(child_node, not is_max, search_depth)
+            current_value = self._minimax(child_node, not is_max, search_depth)
+            self.board.undo_move(undo)
 
             if is_max and current_value > node.value:
                 node.value = current_value
@@ -161,84 +249,536 @@ class Solver:
         return node.value
     
 
+    def search(self, node, is_max):
+        self.stats = self.search_stats = SearchStats(self, self.profile)
+        if self.tablebase is not None and self.search_tablebase(node, is_max):
+            self.stats.source = "tablebase"
+        elif self.book is not None and self.search_book(node, is_max):
+            self.stats.source = "book"
+        else:
+            self.move_orderer.new_search()
+            depth_remaining = self.search_depth - node.depth
+            self.stats.depth = depth_remaining
+            if self.time_ms is not None:
+                self.iterative_deepening(node, self.time_ms, is_max)
+            elif (self.aspiration_window is not None or self.progress_callback is not None) and depth_remaining > 1:
+                self.iterative_deepening(node, None, is_max, depth_remaining)
+            elif self.workers > 1 and depth_remaining > 1:
+                from parallel import search_root_parallel
+                search_root_parallel(self, node, depth_remaining, is_max, self.workers)
+            else:
+                self.alphabeta(node, depth_remaining, -float('inf'), float('inf'), is_max)
+        self.stats.finish()
+        # This search's tree, and everything the solver still holds
+        nodes_retained = self.count_retained(node)
+        self.nodes_retained = nodes_retained if node is self.root else self.count_retained(self.root)
+        self.stats.log(nodes_retained=nodes_retained, peak_rss_mb=peak_rss_bytes() / (1 << 20))
+        return node.value
+
+    def search_book(self, node, is_max):
+        # Plays the book's line from node when the book searched node at
+        # least as deep as this solver would
+        board = node.board.deepcopy()
+        turn_color = self.player_color if is_max else self.opponent_color
+        line = []
+        while len(line) < self.search_depth - node.depth:
+            entry = self.book.lookup(board, turn_color)
+            if entry is None:
+                break
+            if not line and self.time_ms is None and entry.depth < self.search_depth - node.depth:
+                return False
+            value = entry.value
+            if abs(value) > self.evaluator.max_value:
+                # Book mate scores count plies from the entry's position
+                plies = round(self.win_reward / abs(value))
+                value = math.copysign(self.win_reward / (node.depth + len(line) + plies), value)
+            # Book values are for the side to move
+            line.append((entry.move, value if turn_color == self.player_color else -value))
+            undo = board.apply_move(decode_move(board, entry.move), turn_color)
+            if isinstance(undo.piece_destroyed, Pharaoh):
+                break
+            turn_color = self.opponent_color if turn_color == self.player_color else self.player_color
+        if not line:
+            return False
+
+        node.best_child = self.attach_line(node, line, is_max)
+        node.value = line[0][1]
+        print(f"Book line of {len(line)} moves, value {node.value}")
+        return True
+
+    def search_tablebase(self, node, is_max):
+        # Follows the tablebase to the end of the game, the values are the
+        # mate scores a search would have found
+        board = node.board.deepcopy()
+        turn_color = self.player_color if is_max else self.opponent_color
+        line = []
+        while True:
+            entry = self.tablebase.probe(board, turn_color)
+            if entry is None:
+                break
+            value = self.win_reward / (node.depth + len(line) + entry.depth)
+            # Entries are won or lost for the side to move
+            if (entry.value > 0) != (turn_color == self.player_color):
+                value = -value
+            line.append((entry.move, value))
+            undo = board.apply_move(decode_move(board, entry.move), turn_color)
+            if isinstance(undo.piece_destroyed, Pharaoh):
+                break
+            turn_color = self.opponent_color if turn_color == self.player_color else self.player_color
+        if not line:
+            return False
+
+        node.best_child = self.attach_line(node, line, is_max)
+        node.value = line[0][1]
+        print(f"Tablebase line of {len(line)} moves, value {node.value}")
+        return True
+
+    def attach_line(self, node, line, is_max):
+        # Rebuilds the nodes for line, [(move code, value), ...] starting with
+        # a move from node, and returns the first one
+        board = node.board.deepcopy()
+        parent = node
+        first_child = None
+        for move, value in line:
+            turn_color = self.player_color if is_max else self.opponent_color
+            piece, move_action = decode_move(board, move)
+            move_record = (piece.deepcopy() if piece is not None else None, move_action)
+            undo = board.apply_move((piece, move_action), turn_color)
+            piece_destroyed = undo.piece_destroyed.deepcopy() if undo.piece_destroyed is not None else None
+            child_node = TreeNode(None, parent, move_record, piece_destroyed, turn_color)
+            child_node.value = value
+            parent.add_child(child_node, move_record)
+            if first_child is None:
+                first_child = child_node
+            else:
+                parent.best_child = child_node
+            parent = child_node
+            is_max = not is_max
+        return first_child
+
+    def iterative_deepening(self, node, time_ms, is_max=True, max_depth=None):
+        # Search depth 1, 2, ... until the deadline passes and keep the principal
+        # variation of the last depth that finished
+        if max_depth is None:
+            max_depth = self.search_depth
+        deadline = time.perf_counter() + time_ms / 1000 if time_ms is not None else None
+        completed_pv = None
+        self.pv_hint = {}
+
+        for depth in range(1, max_depth + 1):
+            # Depth 1 always runs to completion so there is a move to return
+            self.deadline = deadline if depth > 1 else None
+            iteration_start = time.perf_counter()
+            iteration_nodes = self.nodes_searched
+            try:
+                if completed_pv is not None and self.aspiration_window is not None:
+                    self.aspiration_search(node, depth, completed_pv[0][1], is_max)
+                else:
+                    self.alphabeta(node, depth, -float('inf'), float('inf'), is_max)
+            except SearchTimeout:
+                self.restore_principal_variation(completed_pv)
+                break
+            finally:
+                self.deadline = None
+
+            completed_pv = self.principal_variation(node)
+            self.completed_depth = depth
+            self.stats.depth = depth
+            self.stats.iterations.append((depth, self.nodes_searched - iteration_nodes, time.perf_counter() - iteration_start))
+            self.pv_hint = {pv_node.depth: move_key(pv_node.best_child.move) for pv_node, _ in completed_pv[:-1]}
+            if self.debug:
+                print(f"Completed depth {depth} with value {node.value}")
+            if self.progress_callback is not None:
+                self.progress_callback(depth, self.nodes_searched, completed_pv)
+
+            # A forced win or loss will not change with more depth
+            if isinstance(completed_pv[-1][0].piece_destroyed, Pharaoh):
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        return node.value
+
+    def aspiration_search(self, node, depth, previous_value, is_max):
+        # Mate scores jump with depth, a window around one is wasted
+        if abs(previous_value) > self.evaluator.max_value:
+            return self.alphabeta(node, depth, -float('inf'), float('inf'), is_max)
+        alpha = previous_value - self.aspiration_window
+        beta = previous_value + self.aspiration_window
+        while True:
+            value = self.alphabeta(node, depth, alpha, beta, is_max)
+            # Outside the window the value is only a bound, open that side
+            if value <= alpha:
+                alpha = -float('inf')
+            elif value >= beta:
+                beta = float('inf')
+            else:
+                return value
+            self.researches += 1
+
+    def principal_variation(self, node):
+        # Nodes along best_child with the values they had when the line was found
+        pv = [node]
+        while pv[-1].best_child is not None:
+            pv.append(pv[-1].best_child)
+        return [(pv_node, pv_node.value) for pv_node in pv]
+
+    def restore_principal_variation(self, saved_pv):
+        # An unfinished iteration rewrites best_child and value on the way down,
+        # the children from the previous iteration are still intact
+        if saved_pv is None:
+            return
+        for i, (pv_node, value) in enumerate(saved_pv):
+            pv_node.value = value
+            if i + 1 < len(saved_pv):
+                child = saved_pv[i + 1][0]
+                pv_node.best_child = child
+                pv_node.add_child(child, child.move)
+            else:
+                pv_node.best_child = None
+
+    def check_deadline(self):
+        self.nodes_until_time_check -= 1
+        if self.nodes_until_time_check > 0:
+            return
+        self.nodes_until_time_check = self.time_check_interval
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+
+    def reply_search_depth(self, node):
+        # Depth get_next_best_move would search node at
+        if self.time_ms is not None:
+            return max(self.completed_depth - 1, 1)
+        return max(self.search_depth - node.depth, 1)
+
+    def start_pondering(self):
+        # Search the opponent's likely replies to current_node in the background,
+        # stop_pondering has to be called before the solver is used again
+        self.stop_pondering()
+        self.stop_event = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.ponder, args=(self.current_node, self.stop_event), daemon=True)
+        self.ponder_thread.start()
+
+    def close(self):
+        self.stop_pondering()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown(cancel_futures=True)
+            self.worker_pool = None
+
+    def stop_pondering(self):
+        ponder_thread, stop_event = self.ponder_thread, self.stop_event
+        if ponder_thread is None:
+            return
+        stop_event.set()
+        ponder_thread.join()
+        self.ponder_thread = None
+        self.stop_event = None
+
+    def likely_replies(self, node):
+        if node.turn_color is None:
+            return []
+        reply_color = "Silver" if node.turn_color == "Red" else "Red"
+        board = node.board
+        expected_move = move_key(node.best_child.move) if node.best_child is not None else None
+        possible_moves = self.move_orderer.order(board, board.generate_moves(reply_color), reply_color, node.depth, expected_move)
+
+        replies = []
+        for move in possible_moves[:self.ponder_replies]:
+            piece, move_action = decode_move(board, move)
+            move_record = (piece.deepcopy() if piece is not None else None, move_action)
+            if move_record in node.children:
+                child_node = node.get_child(move_record)
+            else:
+                piece_destroyed = node.board.make_move(move_record, check_allowed=False).fire_laser(reply_color)
+                child_node = TreeNode(None, node, move_record, piece_destroyed, reply_color)
+                node.add_child(child_node, move_record)
+            replies.append(child_node)
+        return replies
+
+    def ponder(self, node, stop_event):
+        # Deepens every likely reply one ply per round, so an interrupted
+        # round only loses the reply it was working on
+        replies = self.likely_replies(node)
+        if not replies:
+            return
+        max_depth = self.reply_search_depth(replies[0]) + self.ponder_extra_depth
+        # Kept apart from search_stats, which still describes the last search
+        self.stats = SearchStats(self, self.profile)
+        self.stats.source = "ponder"
+        try:
+            self.ponder_replies_to_depth(replies, max_depth, stop_event)
+        finally:
+            self.stats.finish()
+            self.nodes_retained = self.count_retained(self.root)
+
+    def ponder_replies_to_depth(self, replies, max_depth, stop_event):
+        for depth in range(1, max_depth + 1):
+            self.stats.depth = depth
+            for reply in replies:
+                if stop_event.is_set():
+                    return
+                if isinstance(reply.piece_destroyed, Pharaoh):
+                    continue
+                is_max = reply.turn_color != self.player_color
+                saved_pv = self.principal_variation(reply) if reply.pondered_depth is not None else None
+                try:
+                    self.alphabeta(reply, depth, -float('inf'), float('inf'), is_max)
+                except SearchTimeout:
+                    if saved_pv is None:
+                        reply.value = None
+                        reply.best_child = None
+                    self.restore_principal_variation(saved_pv)
+                    return
+                reply.pondered_depth = depth
+
     def alphabeta(self, node, depth, alpha, beta, is_max):
+        # The search walks a single working board with apply_move/undo_move,
+        # the nodes it creates rebuild their board on demand
+        self.search_root = node
+        self.board = node.board.deepcopy()
+        if self.profile:
+            profile_board(self, self.board)
+        return self._alphabeta(node, depth, alpha, beta, is_max)
+
+    def expand_child(self, node, move, turn_color):
+        piece, move_action = decode_move(self.board, move)
+        # Snapshot the piece, the working board keeps moving it around
+        move_record = (piece.deepcopy() if piece is not None else None, move_action)
+        undo = self.board.apply_move((piece, move_action), turn_color)
+        piece_destroyed = undo.piece_destroyed.deepcopy() if undo.piece_destroyed is not None else None
+        child_node = TreeNode(None, node, move_record, piece_destroyed, turn_color)
+        self.nodes_searched += 1
+        self.stats.count_node(node.depth - self.search_root.depth)
+        return child_node, undo
+
+    def _alphabeta(self, node, depth, alpha, beta, is_max):
         turn_color = self.player_color if is_max else self.opponent_color
+        if self.deadline is not None or self.stop_event is not None:
+            self.check_deadline()
 
         if depth == 0 or isinstance(node.piece_destroyed, Pharaoh):
             self.grade_board(node)
             return node.value
 
-        possible_moves = node.board.get_all_possible_moves(turn_color)
+        if self.shared_bound is not None:
+            alpha, beta = self.shared_window(node, alpha, beta)
+            if alpha >= beta:
+                node.value = alpha if self.shared_bound_is_max else beta
+                return node.value
+
+        tt_key = self.tt_key(node, turn_color)
+        tt_entry = self.transposition_table.probe(tt_key)
+        tt_move = self.pv_hint.get(node.depth)
+        if tt_entry is not None:
+            if tt_entry.best_move is not None:
+                tt_move = tt_entry.best_move
+            if tt_entry.depth >= depth and node is not self.search_root:
+                if (tt_entry.bound_type == bound.EXACT or
+                    (tt_entry.bound_type == bound.LOWER and tt_entry.value >= beta) or
+                    (tt_entry.bound_type == bound.UPPER and tt_entry.value <= alpha)):
+                    self.attach_tt_child(node, tt_entry, turn_color)
+                    node.value = tt_entry.value
+                    return node.value
+
+        self.stats.interior_nodes += 1
+        alpha_original = alpha
+        beta_original = beta
+        possible_moves = self.move_orderer.order(self.board, self.board.generate_moves(turn_color), turn_color, node.depth, tt_move)
         if is_max:
             value = -float('inf')
-            for move in possible_moves:
-                child_board = node.board.make_move(move, check_allowed=True)
-                piece_destroyed = child_board.fire_laser(turn_color)
-                child_node = TreeNode(child_board, node, move, piece_destroyed)
-                node.add_child(child_node, move)
-                child_node_value = self.alphabeta(child_node, depth - 1, alpha, beta, False)
+            for move_number, move in enumerate(possible_moves):
+                child_node, undo = self.expand_child(node, move, turn_color)
+                self.retain_child(node, child_node)
+                child_node_value = self.search_child(child_node, depth - 1, alpha, beta, False, move_number)
+                self.board.undo_move(undo)
                 if child_node_value > value:
                     node.best_child = child_node
                     value = child_node_value
-                    alpha = child_node_value
+                    alpha = max(alpha, child_node_value)
+                elif child_node_value == value and self.prefer_line(child_node, node.best_child):
+                    node.best_child = child_node
                 if isinstance(child_node.piece_destroyed, Pharaoh) and child_node.piece_destroyed.color == self.opponent_color:
                     break 
                 if alpha >= beta:
+                    self.move_orderer.record_cutoff(move, turn_color, node.depth, depth, move_number)
+                    self.stats.count_cutoff(move_number)
                     if self.debug:
                         print(f"Pruning at depth {depth} because alpha {alpha} >= beta {beta}")
                     break
-            value = value
-            node.value = value
-            return value
         else:
             value = float('inf')
-            for move in possible_moves:
-                child_board = node.board.make_move(move, check_allowed=True)
-                piece_destroyed = child_board.fire_laser(turn_color)
-                child_node = TreeNode(child_board, node, move, piece_destroyed)
-                node.add_child(child_node, move)
-                child_node_value = self.alphabeta(child_node, depth - 1, alpha, beta, True)
+            for move_number, move in enumerate(possible_moves):
+                child_node, undo = self.expand_child(node, move, turn_color)
+                self.retain_child(node, child_node)
+                child_node_value = self.search_child(child_node, depth - 1, alpha, beta, True, move_number)
+                self.board.undo_move(undo)
                 if child_node_value < value:
                     node.best_child = child_node
                     value = child_node_value
-                    beta = child_node_value
+                    beta = min(beta, child_node_value)
+                elif child_node_value == value and self.prefer_line(child_node, node.best_child):
+                    node.best_child = child_node
                 if isinstance(child_node.piece_destroyed, Pharaoh) and child_node.piece_destroyed.color == self.player_color:
                     break 
                 if alpha >= beta:
+                    self.move_orderer.record_cutoff(move, turn_color, node.depth, depth, move_number)
+                    self.stats.count_cutoff(move_number)
                     if self.debug:
                         print(f"Pruning at depth {depth} because alpha {alpha} >= beta {beta} with parent ID {node.node_id}")
                     break
-            value = value
-            node.value = value
-            return value
+
+        node.value = value
+        if value <= alpha_original:
+            bound_type = bound.UPPER
+        elif value >= beta_original:
+            bound_type = bound.LOWER
+        else:
+            bound_type = bound.EXACT
+        best_move = None
+        if node.best_child is not None:
+            best_move = move_key(node.best_child.move)
+        self.transposition_table.store(tt_key, depth, value, bound_type, best_move)
+        return value
+
+    def shared_window(self, node, alpha, beta):
+        # Narrows the window to what another worker's root move already
+        # scored. Nothing below node beats a mate on the next ply, so once a
+        # mate is published the deeper lines that cannot be shorter are cut.
+        best_possible = max(self.evaluator.max_value, self.win_reward / (node.depth + 1))
+        bound_value = self.shared_bound.value
+        if self.shared_bound_is_max:
+            return max(alpha, bound_value), min(beta, best_possible)
+        return max(alpha, -best_possible), min(beta, bound_value)
+
+    def search_child(self, child_node, depth, alpha, beta, is_max, move_number):
+        # is_max is the child's side. Under PVS only the first child gets the
+        # full window, the others are searched again if the scout says they
+        # could be better.
+        bound_to_beat = beta if is_max else alpha
+        if self.mode != search_mode.PVS or move_number == 0 or math.isinf(bound_to_beat):
+            return self._alphabeta(child_node, depth, alpha, beta, is_max)
+        if is_max:
+            value = self._alphabeta(child_node, depth, beta - PVS_EPSILON, beta, True)
+        else:
+            value = self._alphabeta(child_node, depth, alpha, alpha + PVS_EPSILON, False)
+        if alpha < value < beta:
+            self.researches += 1
+            value = self._alphabeta(child_node, depth, alpha, beta, is_max)
+        return value
+
+    def retain_child(self, node, child_node):
+        if self.retain_ply is None or node.depth - self.search_root.depth < self.retain_ply:
+            node.add_child(child_node, child_node.move)
+
+    def count_retained(self, node):
+        # Nodes still reachable below node, through children and best_child
+        # lines past retain_ply. Subtrees replaced by a later search are gone.
+        count = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children.values())
+            best_child = node.best_child
+            if best_child is not None and node.children.get(best_child.move) is not best_child:
+                stack.append(best_child)
+        return count - 1
+
+    def prefer_line(self, node, best_node):
+        # Between equally valued lines keep one without a PASS. The solution
+        # sent to the UI cannot express a PASS, so move ordering puts it last
+        # and the tablebase breaks its ties the same way.
+        return self.line_has_pass(best_node) and not self.line_has_pass(node)
+
+    def line_has_pass(self, node):
+        while node is not None:
+            if node.move[0] is None:
+                return True
+            node = node.best_child
+        return False
+
+    def tt_key(self, node, turn_color):
+        # Mate scores depend on the ply they are found at, so only positions
+        # reached at the same ply are treated as transpositions
+        return self.board.zobrist_hash ^ side_key(turn_color) ^ ply_key(node.depth)
+
+    def attach_tt_child(self, node, tt_entry, turn_color):
+        # Keep the principal variation walkable through best_child after a cutoff
+        if tt_entry.best_move is None:
+            node.best_child = None
+            return
+        child_node, undo = self.expand_child(node, tt_entry.best_move, turn_color)
+        self.board.undo_move(undo)
+        child_node.value = tt_entry.value
+        self.retain_child(node, child_node)
+        node.best_child = child_node
             
-    def find_winning_node_single_agent(self):
-        # Create a queue to hold the nodes to be expanded
-        queue = [self.root]
-        opponent_color = "Silver" if self.player_color == "Red" else "Red"
-
-        # While there are nodes to be expanded
-        while queue:
-            current_node = queue.pop(0)
-            # Check if the current node is a goal state
-            if current_node.board.is_pharoh_destroyed(opponent_color):
-                return current_node
-
-            # Expand the current node
-            possible_moves=current_node.board.get_all_possible_moves(self.player_color)
-
-            for move in possible_moves:
-                child_board = current_node.board.make_move(move, check_allowed=True)
-                piece_destroyed = child_board.fire_laser(self.player_color)
-
-                if TreeNode.is_visited(child_board):
+    def find_winning_node_single_agent(self, heuristic=False):
+        # Only player_color moves. Breadth first finds the shortest win, with
+        # heuristic the frontier is ordered by depth plus laser_distance, which
+        # usually gets there sooner but is not guaranteed to be shortest.
+        # Frontier entries hold packed boards, visited positions are hashes.
+        root_board = CompactBoard.from_board(self.root.board)
+        m, n = root_board.m, root_board.n
+        visited = {root_board.zobrist_hash}
+        stats = {"expanded": 0, "visited": 1, "max_frontier": 1, "depth": 0}
+        self.single_agent_stats = stats
+        counter = 0 # keeps heap order stable between equal priorities
+        if heuristic:
+            frontier = [(self.laser_distance(root_board), counter, root_board.pack(), self.root)]
+        else:
+            frontier = deque([(root_board.pack(), self.root)])
+
+        while frontier:
+            if heuristic:
+                _, _, cells, current_node = heapq.heappop(frontier)
+            else:
+                cells, current_node = frontier.popleft()
+            board = CompactBoard.unpack(cells, m, n)
+            stats["expanded"] += 1
+
+            for move in board.generate_moves(self.player_color):
+                # Pieces from a CompactBoard are detached copies already
+                piece, move_action = decode_move(board, move)
+                undo = board.apply_move((piece, move_action), self.player_color)
+                if board.zobrist_hash in visited:
+                    board.undo_move(undo)
+                    continue
+                visited.add(board.zobrist_hash)
+
+                piece_destroyed = undo.piece_destroyed
+                child_node = TreeNode(None, current_node, (piece, move_action), piece_destroyed, self.player_color)
+                self.nodes_searched += 1
+                if isinstance(piece_destroyed, Pharaoh):
+                    if piece_destroyed.color == self.opponent_color:
+                        stats["visited"] = len(visited)
+                        stats["depth"] = child_node.depth
+                        return child_node
+                    # Our own Pharaoh is gone, nothing to continue from
+                    board.undo_move(undo)
                     continue
-                child_node = TreeNode(child_board, current_node, move, piece_destroyed)
-                if isinstance(piece_destroyed, Pharaoh) and piece_destroyed.color == opponent_color:
-                    return child_node
-                current_node.add_child(child_node, move)
-                queue.append(child_node)
 
+                if heuristic:
+                    counter += 1
+                    heapq.heappush(frontier, (child_node.depth + self.laser_distance(board), counter, board.pack(), child_node))
+                else:
+                    frontier.append((board.pack(), child_node))
+                board.undo_move(undo)
+            stats["max_frontier"] = max(stats["max_frontier"], len(frontier))
+
+        stats["visited"] = len(visited)
+        return None
+
+    def laser_distance(self, board):
+        # Squares (king moves) between our beam and the opponent's Pharaoh
+        pharaoh_position = board.get_pharaoh_position(self.opponent_color)
+        beam = board.get_actionable_spaces(self.player_color)
+        if pharaoh_position is None or not beam:
+            return 0
+        x, y = pharaoh_position
+        return min(max(abs(x - beam_x), abs(y - beam_y)) for beam_x, beam_y in beam)
 
     def grade_board(self, node):
         if isinstance(node.piece_destroyed, Pharaoh):
@@ -247,19 +787,44 @@ class Solver:
             else:
                 node.value = self.win_reward/node.depth
         else:
-            #TODO generate better heuristic
-            node.value = 0
+            # The working board is in this node's position during a search
+            node.value = self.evaluator.evaluate(self.board, self.player_color)
 
     def num_nodes_searched(self):
-        return TreeNode.num_nodes_made()
+        return self.nodes_searched
+
+def compare_search_modes(board, player_color, search_depth, configurations=None):
+    # Runs the same fixed depth search with each set of Solver options
+    if configurations is None:
+        configurations = {
+            "alphabeta": {},
+            "pvs": {"mode": search_mode.PVS},
+            "aspiration": {"aspiration_window": 0.25},
+            "pvs+aspiration": {"mode": search_mode.PVS, "aspiration_window": 0.25},
+        }
+    results = {}
+    for name, options in configurations.items():
+        solver = Solver(board.deepcopy(), player_color, search_depth=search_depth, **options)
+        start = time.perf_counter()
+        solver.search(solver.root, True)
+        results[name] = {
+            "value": solver.root.value,
+            "nodes": solver.nodes_searched,
+            "researches": solver.researches,
+            "seconds": time.perf_counter() - start,
+        }
+    return results
 
 class TreeNode:
-    visited_boards = set()
+    visited_boards = set() # zobrist hashes of the boards nodes were created with
     nodes_made = 0
 
-    def __init__(self, board, parent=None, move=None, piece_destroyed=None):
-        self.board = board
+    def __init__(self, board, parent=None, move=None, piece_destroyed=None, turn_color=None):
+        # Nodes created by the search have no board of their own, it is
+        # rebuilt from the parent the first time it is needed
+        self._board = board
         self.parent = parent
+        self.turn_color = turn_color
         self.children = {}   
         self.move = move
         self.depth = parent.depth + 1 if parent is not None else 0
@@ -267,10 +832,20 @@ class TreeNode:
         self.piece_destroyed = piece_destroyed
         self.value = None
         self.best_child = None
+        self.pondered_depth = None # depth of the last background search rooted here
         TreeNode.nodes_made += 1  # Increment the counter when a node is created
-        TreeNode.add_visited_board(board)
+        if board is not None:
+            TreeNode.add_visited_board(board)
         self.node_id = TreeNode.nodes_made
 
+    @property
+    def board(self):
+        if self._board is None:
+            board = self.parent.board.make_move(self.move, check_allowed=False)
+            board.fire_laser(self.turn_color)
+            self._board = board
+        return self._board
+
     def get_value(self):
         return self.value
 
@@ -282,18 +857,16 @@ class TreeNode:
 
     @classmethod
     def add_visited_board(cls, board):
-        cls.visited_boards.add(board)
+        cls.visited_boards.add(board.zobrist_hash)
 
     @classmethod
     def reset_visited(cls):
         cls.visited_boards = set()
-        nodes_made = 0
+        cls.nodes_made = 0
 
     @classmethod
     def is_visited(cls, board):
-        if board in cls.visited_boards:
-            return True
-        return False
+        return board.zobrist_hash in cls.visited_boards
 
     @classmethod
     def num_nodes_made(cls):
@@ -311,23 +884,8 @@ class TreeNode:
             print(f"    Depth {child.depth}: Value {child.value} Move {child.move[0]} to {child.move[1]}")
 
     def draw_tree(self):
-        import matplotlib.pyplot as plt
-
-        def add_edges(graph, node):
-            for child in node.children:
-                graph.add_edge(node, child)
-                add_edges(graph, child)
-
-        graph = nx.DiGraph()
-        add_edges(graph, self)
-
-        pos = nx.spring_layout(graph)
-        labels = {node: f"Depth {node.depth}\nValue {node.value}" for node in graph.nodes()}
-
-        plt.figure(figsize=(12, 8))
-        nx.draw(graph, pos, with_labels=True, labels=labels, node_size=3000, node_color="skyblue", font_size=10, font_weight="bold", arrows=True)
-        plt.title("Tree Structure")
-        plt.show()
+        from visualization import draw_tree
+        draw_tree(self)
     
 
 
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import struct
+from array import array
+from collections import deque
+from piece import Pharaoh
+from board import parse_board_data
+from book import API_DIR, BOARDS_DIR, Book, BookEntry, write_records
+from compact_board import CompactBoard, COLORS
+from movegen import PASS_MOVE, decode_move
+from zobrist import side_key
+
+DEFAULT_TABLEBASE_FILE = os.path.join(API_DIR, "tablebase.bin")
+PUZZLE_BOARDS = ["mate_1", "mate_2", "mate_3"]
+
+TABLEBASE_MAGIC = b"KHETTBSE"
+TABLEBASE_VERSION = 1
+TABLEBASE_HEADER = struct.Struct("<8sIII")  # magic, version, number of records, max pieces
+
+# Results for the side to move, stored as the record value. The record depth
+# is the number of plies until a Pharaoh is hit with best play from both sides.
+WIN = 1
+LOSS = -1
+
+class Tablebase(Book):
+    # Same records as the book. It covers the positions reachable from the
+    # boards it was built from (the bundled puzzles by default) that have at
+    # most max_pieces pieces, not every position that small. Positions that
+    # are missing are draws or were never reached.
+    file_kind = "tablebase"
+    file_magic = TABLEBASE_MAGIC
+    file_version = TABLEBASE_VERSION
+    header = TABLEBASE_HEADER
+
+    def __init__(self, path=DEFAULT_TABLEBASE_FILE):
+        super().__init__(path)
+        self.max_pieces = self.header_fields[0] # as built, see build_tablebase
+
+    @classmethod
+    def load_default(cls):
+        if os.path.exists(DEFAULT_TABLEBASE_FILE):
+            return cls(DEFAULT_TABLEBASE_FILE)
+        return None
+
+    def probe(self, board, color):
+        if bin(board.occupancy).count("1") > self.max_pieces:
+            return None
+        return self.lookup(board, color)
+
+class PositionGraph:
+    # Every position reachable from a start position, with the move and the
+    # resulting position of each move that does not end the game
+    def __init__(self, start_board, start_color):
+        self.m = start_board.m
+        self.n = start_board.n
+        self.ids = {}
+        self.positions = [] # (cells, color index)
+        self.winning_moves = {} # position id -> a move that hits the opponent's Pharaoh
+        self.edge_offsets = array('i', [0])
+        self.edge_targets = array('i')
+        self.edge_moves = array('i')
+
+        compact_board = CompactBoard.from_board(start_board)
+        self.add_position(compact_board.pack(), COLORS.index(start_color))
+        position_id = 0
+        while position_id < len(self.positions):
+            self.expand(position_id)
+            position_id += 1
+
+    def add_position(self, cells, color_index):
+        position_id = self.ids.get((cells, color_index))
+        if position_id is None:
+            position_id = len(self.positions)
+            self.ids[(cells, color_index)] = position_id
+            self.positions.append((cells, color_index))
+        return position_id
+
+    def expand(self, position_id):
+        cells, color_index = self.positions[position_id]
+        color = COLORS[color_index]
+        board = CompactBoard.unpack(cells, self.m, self.n)
+        for move in board.generate_moves(color):
+            undo = board.apply_move(decode_move(board, move), color)
+            piece_destroyed = undo.piece_destroyed
+            if isinstance(piece_destroyed, Pharaoh):
+                board.undo_move(undo)
+                if piece_destroyed.color != color:
+                    # Nothing else matters once there is a win in one
+                    self.winning_moves[position_id] = move
+                    break
+                # Hitting our own Pharaoh is never played
+                continue
+            self.edge_targets.append(self.add_position(board.pack(), 1 - color_index))
+            self.edge_moves.append(move)
+            board.undo_move(undo)
+        self.edge_offsets.append(len(self.edge_targets))
+
+    def __len__(self):
+        return len(self.positions)
+
+def retrograde_analysis(graph):
+    # Works back from the wins in one. A position is won when one move reaches
+    # a lost position, and lost once every move reaches a won one. Positions
+    # come off the queue in order of distance, so wins get the shortest and
+    # losses the longest line.
+    num_positions = len(graph)
+    result = [0] * num_positions
+    distance = [0] * num_positions
+    best_move = [PASS_MOVE] * num_positions
+    # A position with a win in one keeps its other moves unexplored
+    remaining = [graph.edge_offsets[i + 1] - graph.edge_offsets[i] for i in range(num_positions)]
+
+    # Reverse edges, grouped by target
+    predecessor_offsets = array('i', [0] * (num_positions + 1))
+    for target in graph.edge_targets:
+        predecessor_offsets[target + 1] += 1
+    for i in range(num_positions):
+        predecessor_offsets[i + 1] += predecessor_offsets[i]
+    predecessor_edges = array('i', [0] * len(graph.edge_targets))
+    fill = array('i', predecessor_offsets)
+    edge_sources = array('i', [0] * len(graph.edge_targets))
+    for source in range(num_positions):
+        for edge in range(graph.edge_offsets[source], graph.edge_offsets[source + 1]):
+            edge_sources[edge] = source
+            target = graph.edge_targets[edge]
+            predecessor_edges[fill[target]] = edge
+            fill[target] += 1
+
+    queue = deque()
+    for position_id, move in graph.winning_moves.items():
+        result[position_id] = WIN
+        distance[position_id] = 1
+        best_move[position_id] = move
+        queue.append(position_id)
+
+    # Between equally long lines keep one without a PASS, see Solver.prefer_line
+    while queue:
+        position_id = queue.popleft()
+        line_distance = distance[position_id] + 1
+        for i in range(predecessor_offsets[position_id], predecessor_offsets[position_id + 1]):
+            edge = predecessor_edges[i]
+            source = edge_sources[edge]
+            move = graph.edge_moves[edge]
+            if result[source] != 0:
+                if (result[source] == WIN and result[position_id] == LOSS and distance[source] == line_distance
+                        and best_move[source] == PASS_MOVE):
+                    best_move[source] = move
+                continue
+            if result[position_id] == LOSS:
+                result[source] = WIN
+                distance[source] = line_distance
+                best_move[source] = move
+                queue.append(source)
+                continue
+            # The losing side takes the longest line, its distance is
+            # tracked while the position is still undecided
+            if line_distance > distance[source] or best_move[source] == PASS_MOVE:
+                distance[source] = line_distance
+                best_move[source] = move
+            remaining[source] -= 1
+            if remaining[source] == 0:
+                result[source] = LOSS
+                queue.append(source)
+    return result, distance, best_move
+
+def add_results(entries, graph, result, distance, best_move):
+    for position_id, (cells, color_index) in enumerate(graph.positions):
+        # Undecided, or too long for the record's depth byte
+        if result[position_id] == 0 or distance[position_id] > 255:
+            continue
+        board = CompactBoard.unpack(cells, graph.m, graph.n)
+        key = board.zobrist_hash ^ side_key(COLORS[color_index])
+        entries[key] = BookEntry(key, best_move[position_id], distance[position_id], result[position_id])
+
+def build_tablebase(board_names=PUZZLE_BOARDS, path=DEFAULT_TABLEBASE_FILE, max_pieces=4):
+    entries = {}
+    for board_name in board_names:
+        with open(os.path.join(BOARDS_DIR, board_name + ".txt")) as board_file:
+            board = parse_board_data(json.load(board_file))
+        num_pieces = len(board.get_list_of_pieces())
+        if num_pieces > max_pieces:
+            print(f"{board_name}: skipped, {num_pieces} pieces")
+            continue
+        if board.zobrist_hash ^ side_key("Silver") in entries:
+            # Already reached from an earlier board, and so is everything after it
+            print(f"{board_name}: covered by an earlier board")
+            continue
+        # PASS is always legal, so this reaches the positions with Red to move as well
+        graph = PositionGraph(board, "Silver")
+        result, distance, best_move = retrograde_analysis(graph)
+        add_results(entries, graph, result, distance, best_move)
+        print(f"{board_name}: {len(graph)} positions, {len(entries)} decided so far")
+    write_records(path, entries, TABLEBASE_HEADER.pack(TABLEBASE_MAGIC, TABLEBASE_VERSION, len(entries), max_pieces))
+    return len(entries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the endgame tablebase for positions reachable from the given boards")
+    parser.add_argument("boards", nargs="*", default=PUZZLE_BOARDS)
+    parser.add_argument("--output", default=DEFAULT_TABLEBASE_FILE)
+    parser.add_argument("--max-pieces", type=int, default=4)
+    args = parser.parse_args()
+    num_positions = build_tablebase(args.boards, args.output, args.max_pieces)
+    print(f"Wrote {num_positions} positions to {args.output}")
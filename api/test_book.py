@@ -0,0 +1,36 @@
+import json
+import os
+from board import parse_board_data
+from book import BOARDS_DIR, Book, add_line, write_records
+from solver import Solver
+
+def load_board(name):
+    with open(os.path.join(BOARDS_DIR, name + ".txt")) as board_file:
+        return parse_board_data(json.load(board_file))
+
+def test_book_mate_score_below_root(tmp_path):
+    searched = Solver(load_board("mate_2"), "Silver", search_depth=4)
+    searched.search(searched.root, True)
+    node = searched.root.best_child.best_child
+    searched.search(node, True)
+
+    # Book entries for the position two plies in, searched as a root of its own
+    book_solver = Solver(node.board, "Silver", search_depth=4)
+    book_solver.search(book_solver.root, True)
+    entries = {}
+    add_line(entries, book_solver, book_solver.root, "Silver", 4)
+    path = str(tmp_path / "book.bin")
+    write_records(path, entries)
+    book = Book(path)
+
+    probed = Solver(load_board("mate_2"), "Silver", search_depth=4)
+    probed.search(probed.root, True)
+    probed_node = probed.root.best_child.best_child
+    probed.book = book
+    probed.search(probed_node, True)
+
+    assert probed.search_stats.source == "book"
+    assert probed_node.value == node.value
+    # The line stops at the search horizon
+    assert len(probed.get_solution(probed_node)) <= probed.search_depth - probed_node.depth
+    book.close()
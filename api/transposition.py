@@ -0,0 +1,69 @@
+from enum import Enum
+
+class bound(Enum):
+    EXACT = 0
+    LOWER = 1 # value is a lower bound (search failed high)
+    UPPER = 2 # value is an upper bound (search failed low)
+
+class replacement(Enum):
+    ALWAYS = 0          # newest entry always wins the slot
+    DEPTH_PREFERRED = 1 # keep the deeper search, ties go to the newest entry
+    KEEP = 2            # never overwrite another position's entry
+
+class TTEntry:
+    def __init__(self, key, depth, value, bound_type, best_move):
+        self.key = key
+        self.depth = depth
+        self.value = value
+        self.bound_type = bound_type
+        self.best_move = best_move
+
+class TranspositionTable:
+    def __init__(self, size=1 << 18, replacement_policy=replacement.DEPTH_PREFERRED):
+        if size & (size - 1) != 0:
+            raise ValueError(f"Transposition table size must be a power of two, got {size}")
+        self.size = size
+        self.mask = size - 1
+        self.replacement_policy = replacement_policy
+        self.entries = [None] * size
+        self.num_entries = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.num_entries = 0
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound_type, best_move):
+        index = key & self.mask
+        current = self.entries[index]
+
+        if current is None:
+            self.num_entries += 1
+        elif current.key == key:
+            # Same position: only a shallower result may not replace a deeper one
+            if depth < current.depth and self.replacement_policy != replacement.ALWAYS:
+                if current.best_move is None:
+                    current.best_move = best_move
+                return
+        elif self.replacement_policy == replacement.KEEP:
+            return
+        elif self.replacement_policy == replacement.DEPTH_PREFERRED and depth < current.depth:
+            return
+
+        self.entries[index] = TTEntry(key, depth, value, bound_type, best_move)
+
+    def hit_rate(self):
+        if self.probes == 0:
+            return 0
+        return self.hits / self.probes
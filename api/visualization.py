@@ -0,0 +1,50 @@
+# Debug plots. matplotlib and networkx are only imported when one of these
+# is called, the server and search processes never load them.
+
+def display_board(board):
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+
+    fig, ax = plt.subplots()
+    ax.set_xlim(0, board.m)
+    ax.set_ylim(0, board.n)
+    ax.set_aspect('equal')
+
+    cell_width = 1
+    cell_height = 1
+
+    for i, row in enumerate(board.grid):
+        for j, piece in enumerate(row):
+            rect = patches.Rectangle((j * cell_width, (7 - i) * cell_height), cell_width, cell_height, linewidth=1, edgecolor='black', facecolor='none')
+            ax.add_patch(rect)
+            if piece:
+                ax.text(j * cell_width + cell_width / 2, (7 - i) * cell_height + cell_height / 2, str(piece), ha='center', va='center', fontsize=12, color=piece.color)
+
+    # Set the ticks to have chesslike rank and file annotations
+    ax.set_xticks([i + 0.5 for i in range(board.m)])
+    ax.set_yticks([i + 0.5 for i in range(board.n)])
+    ax.set_xticklabels([str(i) for i in range(board.m)])
+    ax.set_yticklabels([str(board.n - i - 1) for i in range(board.n)])
+
+    plt.gca().invert_yaxis()
+    plt.show()
+
+def draw_tree(root):
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    def add_edges(graph, node):
+        for child in node.children.values():
+            graph.add_edge(node, child)
+            add_edges(graph, child)
+
+    graph = nx.DiGraph()
+    add_edges(graph, root)
+
+    pos = nx.spring_layout(graph)
+    labels = {node: f"Depth {node.depth}\nValue {node.value}" for node in graph.nodes()}
+
+    plt.figure(figsize=(12, 8))
+    nx.draw(graph, pos, with_labels=True, labels=labels, node_size=3000, node_color="skyblue", font_size=10, font_weight="bold", arrows=True)
+    plt.title("Tree Structure")
+    plt.show()
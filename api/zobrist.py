@@ -0,0 +1,44 @@
+import random
+
+# Keys are generated from a fixed seed so that a position hashes to the same
+# value in every process (workers, on-disk tables, ...)
+ZOBRIST_SEED = 0x6B686574
+
+MAX_BOARD_WIDTH = 16
+MAX_BOARD_HEIGHT = 16
+NUM_COLORS = 2
+NUM_PIECE_TYPES = 5
+NUM_ORIENTATIONS = 4
+MAX_PLY = 256
+
+COLOR_INDEX = {"Silver": 0, "Red": 1}
+
+_rng = random.Random(ZOBRIST_SEED)
+
+PIECE_KEYS = [_rng.getrandbits(64) for _ in range(NUM_COLORS * NUM_PIECE_TYPES * NUM_ORIENTATIONS * MAX_BOARD_WIDTH * MAX_BOARD_HEIGHT)]
+SIDE_KEYS = {"Silver": _rng.getrandbits(64), "Red": _rng.getrandbits(64)}
+PLY_KEYS = [_rng.getrandbits(64) for _ in range(MAX_PLY)]
+
+def piece_key(piece, position):
+    x, y = position
+    return raw_piece_key(COLOR_INDEX[piece.color], piece.type_index, piece.orientation, x, y)
+
+def raw_piece_key(color_index, type_index, orientation, x, y):
+    index = color_index
+    index = index * NUM_PIECE_TYPES + type_index
+    index = index * NUM_ORIENTATIONS + orientation
+    index = index * MAX_BOARD_HEIGHT + y
+    index = index * MAX_BOARD_WIDTH + x
+    return PIECE_KEYS[index]
+
+def side_key(color):
+    return SIDE_KEYS[color]
+
+def ply_key(ply):
+    return PLY_KEYS[ply % MAX_PLY]
+
+def hash_pieces(list_of_pieces):
+    h = 0
+    for piece in list_of_pieces:
+        h ^= piece_key(piece, piece.position)
+    return h